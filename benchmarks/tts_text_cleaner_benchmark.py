@@ -0,0 +1,62 @@
+"""
+TTS文本清理的基准测试：对比合并正则的TextCleaner与原先逐条re.sub的实现
+运行: python benchmarks/tts_text_cleaner_benchmark.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.tts_text_cleaner import TextCleaner, EMOJI_RULE
+
+def _legacy_clean(text):
+    """原先逐条re.sub的实现，作为基准对比的参照"""
+    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)
+    text = re.sub(r'\*(.+?)\*', r'\1', text)
+    text = re.sub(r'__(.+?)__', r'\1', text)
+    text = re.sub(r'_(.+?)_', r'\1', text)
+    text = re.sub(r'~~(.+?)~~', r'\1', text)
+    text = re.sub(r'`(.+?)`', r'\1', text)
+    text = re.sub(r'```[\s\S]*?```', '', text)
+    text = re.sub(r'^#+\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*[-*+]\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
+    text = re.compile(EMOJI_RULE[1], flags=re.UNICODE).sub('', text)
+    text = re.sub(r'https?://\S+', '', text)
+    text = re.sub(r'www\.\S+', '', text)
+    text = re.sub(r'\[\d+\]', '', text)
+    text = re.sub(r'\n+', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+SAMPLE_TEXT = """## 今日天气与日程安排 🌤️
+
+根据查询结果[1]，**北京**今天*多云转晴*，气温 12~22℃，适合外出 😊。
+
+### 日程提醒
+1. **09:30** 与团队开 `周会`，地点：3号会议室
+2. **14:00** 提交 __季度报告__，参考 https://example.com/report?id=42
+3. ~~18:00 健身~~ 已取消
+
+- 记得带伞 ☔（傍晚可能有阵雨[2]）
+- 文件路径：`D:\\\\work\\\\report_final.docx`
+* 更多信息见 www.example.org/weather
+
+```python
+print("这段代码不应该被朗读")
+```
+
+> 以上信息仅供参考，祝你今天顺利！🎉
+"""
+
+if __name__ == "__main__":
+    cleaner = TextCleaner()
+    samples = {"短句": "好的，已为你打开**记事本**。", "Markdown长回复": SAMPLE_TEXT * 4}
+    for name, sample in samples.items():
+        runs = 2000
+        legacy = timeit.timeit(lambda: _legacy_clean(sample), number=runs) / runs * 1e6
+        single = timeit.timeit(lambda: cleaner.clean(sample), number=runs) / runs * 1e6
+        print(f"[基准] {name}({len(sample)}字): 逐条替换 {legacy:.1f}us, 合并正则 {single:.1f}us, 提速 {legacy / single:.2f}x")
+    print(f"[示例] {cleaner.clean(SAMPLE_TEXT)}")
@@ -28,9 +28,39 @@ WEATHER_API_URL = "https://p96tufjwcb.re.qweatherapi.com/v7"
 # PushPlus通知配置
 PUSHPLUS_TOKEN = os.getenv("PUSHPLUS_TOKEN", "*******************")
 
+# HTTP连接配置（所有对外请求共享连接池）
+HTTP_CONNECT_TIMEOUT = 5  # 连接超时（秒）
+HTTP_READ_TIMEOUT = 60  # 读取超时（秒）
+HTTP_RETRY_TOTAL = 2  # 失败重试次数
+HTTP_RETRY_BACKOFF = 0.5  # 重试退避系数（秒）
+HTTP_POOL_CONNECTIONS = 8  # 连接池数量（按主机）
+HTTP_POOL_MAXSIZE = 8  # 每个主机的最大连接数
+
+# 工具调用配置
+TOOL_MAX_WORKERS = 4  # 同一轮工具调用的最大并发数
+TOOL_TIMEOUT = 30  # 并发工具的默认超时（秒）
+TOOL_TIMEOUTS = {"get_current_location": 20, "get_weather": 30, "extract_webpage_content": 30, "screenshot_and_analyze": 90, "generate_file_summary": 90}  # 各并发工具的超时（秒），不短于工具内HTTP请求的超时
+INTENT_FAST_PATH_ENABLED = True  # 简单指令是否绕过大模型本地执行
+
+# 对话上下文配置
+CONTEXT_TOKEN_BUDGET = 6000  # 发送给模型的上下文token上限
+CONTEXT_KEEP_TURNS = 4  # 保留完整工具结果的最近对话轮数
+
 # 日程数据库文件
 SCHEDULE_DB = "schedules.db"
 
+# 对话记录配置
+CONVERSATION_DB = "conversations.db"  # 对话记录数据库文件
+CONVERSATION_RESTORE_COUNT = 20  # 启动后恢复到上下文的最近消息条数
+CHAT_HISTORY_PAGE_SIZE = 20  # AI对话框每次加载的历史消息条数
+
+# 回复缓存配置
+RESPONSE_CACHE_ENABLED = True  # 是否缓存大模型回复
+RESPONSE_CACHE_DB = "response_cache.db"  # 回复缓存数据库文件
+RESPONSE_CACHE_MAX_ENTRIES = 500  # 最多缓存条数（LRU淘汰）
+RESPONSE_CACHE_TTL = 86400  # 默认有效期（秒）
+REMIND_POLISH_CACHE_TTL = 604800  # 提醒润色结果有效期（秒）
+
 # 日程窗口透明度 (0-100, 0为完全透明, 100为完全不透明)
 SCHEDULE_WINDOW_OPACITY = 81
 
@@ -58,11 +88,24 @@ HOTKEY_CHAT = "ctrl+2"   # AI对话框热键
 WAKE_WORD = "助理助理"  # 唤醒词
 WAKE_WORD_ENABLED = True  # 是否启用语音唤醒
 WAKE_WORD_RESPONSE = "我在"  # 唤醒词回复语句
+WAKE_WORD_MODE = "keyword"  # 唤醒词识别方式: keyword 只识别唤醒词的受限语法，说出即触发、占用CPU少 / open 开放词表识别，停顿后匹配
+WAKE_GATE_ENABLED = True  # 安静时不运行唤醒词识别，检测到声音才开始解码，空闲时几乎不占CPU
+WAKE_WORD_ACTIONS = {"打开对话框": "chat", "别说了": "stop_speech", "暂停音乐": "media:暂停", "播放音乐": "media:播放"}  # 其他唤醒短语及动作: chat 打开对话框 / stop_speech 停止播报 / media:<播放|暂停|下一首|上一首|音量增大|音量减小>
+WAKE_BARGE_IN = True  # 播报回复时保持唤醒词检测，说出唤醒词可打断播报并立即开始录音
+WAKE_BARGE_IN_RATIO = 2.0  # 播报期间麦克风音量超过回声音量多少倍才视为有人说话，扬声器离麦克风较近时调大
 VOSK_MODEL_PATH = os.path.join(BASE_PATH, "vosk-model-small-cn-0.22")  # Vosk模型路径
 
 # 麦克风设备配置
 MICROPHONE_DEVICE_INDEX = None  # None表示使用默认麦克风，否则为设备索引
 SILENCE_DURATION = 2.0  # 静音多少秒后自动停止录音
+AUDIO_BUFFER_SECONDS = 3.0  # 麦克风采集环形缓冲保留的秒数
+RECORD_PREROLL_SECONDS = 0.5  # 录音开始时带上之前多少秒的音频，避免漏掉开口的第一个字
+VAD_ENGINE = "energy"  # 语音检测方式: energy 能量+过零率 / webrtc（需安装webrtcvad）
+VAD_MIN_SILENCE = 0.4  # 一口气说完的短指令静音多少秒即结束录音，说话停顿较长时自动延长，最多SILENCE_DURATION
+VOICE_STREAMING_ENABLED = True  # 流式识别：说话停顿时即在后台开始识别，结束录音时结果已就绪
+VOICE_STREAMING_PAUSE = 0.2  # 停顿多少秒后开始提前识别
+ASR_POLICY = "online"  # 语音识别方式: online 在线 / local 本地Vosk（离线可用） / local_first 本地优先，置信度低时在线识别
+ASR_LOCAL_MIN_CONFIDENCE = 0.8  # local_first模式下本地识别结果的最低平均置信度
 
 # 系统设置
 AUTOSTART_ENABLED = False  # 开机自启（此配置仅用于显示，实际状态从注册表读取)
@@ -74,6 +117,14 @@ TTS_VOICE = "zh-CN-XiaoxiaoNeural"  # 音色
 TTS_SPEED = 1.0  # 语速 (0.25-2.0)
 TTS_PITCH = 1.0  # 音调
 TTS_STREAM = True  # 是否使用流式响应
+TTS_RESPONSE_FORMAT = "mp3"  # 音频格式 (mp3/pcm)，流式响应且为pcm时边下载边播放
+TTS_PCM_SAMPLE_RATE = 24000  # pcm格式的采样率
+TTS_PREFETCH_COUNT = 2  # 播放当前句时最多预先合成的句数
+TTS_CACHE_ENABLED = True  # 是否缓存合成的语音
+TTS_CACHE_DIR = "tts_cache"  # 语音缓存目录
+TTS_CACHE_MAX_MB = 100  # 语音缓存占用磁盘上限（MB），超出时删除最久未使用的
+TTS_CACHE_MEMORY_ENTRIES = 50  # 内存中保留的最近使用语音条数
+TTS_PREWARM_PHRASES = ["操作已完成。"]  # 启动时预先合成的常用短语（唤醒回复总会预合成）
 TTS_REMOVE_MARKDOWN = True  # 移除Markdown
 TTS_REMOVE_EMOJI = True  # 移除Emoji
 TTS_REMOVE_URL = True  # 移除URL
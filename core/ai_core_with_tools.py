@@ -1,8 +1,14 @@
-import requests
+from services.http_client import get_http_client
 import json
+import re
+import time
 import config
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 from .schedule_manager import ScheduleManager
+from .context_manager import ContextManager
+from .conversation_store import ConversationStore
+from .intent_router import IntentRouter
 from services.weather_service import WeatherService
 from services.web_controller import WebController
 from services.vision_service import VisionService
@@ -14,11 +20,45 @@ from services.clipboard_mcp import ClipboardMCP
 from services.web_extract_mcp import WebExtractMCP
 from services.file_summary_mcp import FileSummaryMCP
 from services.office_control_mcp import OfficeControlMCP
+from services.response_cache import get_response_cache
+
+# 网络型工具，同一轮中可以并发执行；其余工具（日程修改、键鼠操作等）按顺序执行
+PARALLEL_TOOLS = {
+    "get_current_location",
+    "get_weather",
+    "extract_webpage_content",
+    "screenshot_and_analyze",
+    "generate_file_summary"
+}
+
+SYSTEM_PROMPT = "你是一个AI助手。重要规则：\n1. 当用户要求设置提醒时，必须立即调用add_schedule工具。时间参数支持相对时间格式（如'1小时后'、'30分钟后'、'10秒后'）。\n2. 当用户查询天气但没有指定城市时，你必须在一次响应中同时调用get_current_location和get_weather两个工具。\n3. 当用户要求修改提醒时，必须先调用find_schedule查找相关日程，然后调用update_schedule修改日程。\n4. 当用户要求删除提醒时，必须先调用find_schedule查找相关日程，然后调用delete_schedule删除日程。\n5. 当用户要求删除所有日程时，必须直接调用delete_all_schedules工具。"
+
+# 用户消息前附加的时间信息，显示历史记录时去掉
+TIME_PREFIX_PATTERN = re.compile(r'^\[当前时间: [^\]]*\] ')
+
+# 只调用了这些只读工具的回复可以缓存，值为缓存有效期（秒）；调用其他工具的回复不缓存
+CACHEABLE_TOOL_TTLS = {
+    "get_weather": 600,
+    "get_current_location": 3600,
+    "find_schedule": 86400,  # 缓存键包含日程版本号和当天日期，日程变化或跨天后自动失效
+    "extract_webpage_content": 1800,
+    "generate_file_summary": 86400
+}
 
 class AIWithTools:
     def __init__(self):
         self.conversation_history = []
+        self.conversation_store = ConversationStore(config.CONVERSATION_DB)
+        self.session_id = None  # 首次对话或查看历史时才加载会话
+        self.session_turns = 0  # 本次运行（或清空历史后）的用户消息数，不含恢复的消息
+        self.intent_router = IntentRouter()
         self.speak_callback = None
+        self.tool_executor = ThreadPoolExecutor(max_workers=config.TOOL_MAX_WORKERS, thread_name_prefix="tool")
+        self.context = ContextManager(
+            config.CONTEXT_TOKEN_BUDGET,
+            keep_turns=config.CONTEXT_KEEP_TURNS,
+            summarizer=self._summarize_history
+        )
         self.schedule = ScheduleManager()
         self.weather = WeatherService()
         self.web = WebController()
@@ -113,7 +153,9 @@ class AIWithTools:
                         "type": "object",
                         "properties": {
                             "task_keyword": {"type": "string", "description": "任务关键词，用于模糊搜索"},
-                            "time": {"type": "string", "description": "精确的提醒时间"}
+                            "time": {"type": "string", "description": "精确的提醒时间"},
+                            "start_time": {"type": "string", "description": "时间范围起点，格式'YYYY-MM-DD'或'YYYY-MM-DD HH:MM:SS'"},
+                            "end_time": {"type": "string", "description": "时间范围终点（包含），格式'YYYY-MM-DD'或'YYYY-MM-DD HH:MM:SS'"}
                         },
                         "required": []
                     }
@@ -378,7 +420,8 @@ class AIWithTools:
     def set_speak_callback(self, callback):
         self.speak_callback = callback
         self.schedule.set_speak_callback(callback)
-        self.schedule.set_ai_chat_callback(self.chat)
+        # 提醒润色是内部请求，不经过对话历史，也不写入对话记录
+        self.schedule.set_ai_chat_callback(self.ask_once)
     
     def execute_tool(self, tool_name, arguments):
         print(f"[DEBUG] 执行工具: {tool_name}, 参数: {arguments}")
@@ -548,7 +591,14 @@ class AIWithTools:
                 task_keyword = arguments.get("task_keyword")
                 time = arguments.get("time")
                 
-                schedules = self.schedule.find_schedules(task_keyword=task_keyword, datetime_str=time)
+                schedules = self.schedule.find_schedules(
+                    task_keyword=task_keyword,
+                    datetime_str=time,
+                    start_datetime=arguments.get("start_time"),
+                    end_datetime=arguments.get("end_time"),
+                    fuzzy=True,
+                    limit=20
+                )
                 
                 if schedules:
                     result = "找到以下日程：\n"
@@ -669,16 +719,150 @@ class AIWithTools:
         
         return "未知工具"
     
-    def chat(self, user_message):
+    def execute_tool_calls(self, tool_calls):
+        """
+        执行一轮中的全部工具调用，返回与tool_calls顺序一致的结果列表
+        网络型工具先提交到线程池并发执行，其余工具在当前线程按顺序执行
+        每个并发工具的超时（TOOL_TIMEOUTS，未设置时为TOOL_TIMEOUT）从提交时开始计算，
+        同时作为该工具HTTP请求的截止时刻，超时的任务不会继续占用工作线程
+        """
+        tool_results = [None] * len(tool_calls)
+        futures = {}
+        sequential = []
+        
+        for i, tool_call in enumerate(tool_calls):
+            function_name = tool_call['function']['name']
+            arguments = json.loads(tool_call['function']['arguments'] or "{}")
+            # 传递原始消息用于判断是否需要微信通知
+            if function_name == "add_schedule":
+                arguments["original_message"] = self.original_user_message
+            
+            if function_name in PARALLEL_TOOLS:
+                deadline = time.monotonic() + config.TOOL_TIMEOUTS.get(function_name, config.TOOL_TIMEOUT)
+                future = self.tool_executor.submit(self._execute_tool_until, deadline, function_name, arguments)
+                futures[i] = (function_name, deadline, future)
+            else:
+                sequential.append((i, function_name, arguments))
+        
+        # 顺序执行的工具与已提交的并发任务同时进行
+        for i, function_name, arguments in sequential:
+            tool_results[i] = self.execute_tool(function_name, arguments)
+        
+        for i, (function_name, deadline, future) in futures.items():
+            try:
+                tool_results[i] = future.result(timeout=max(0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                # 尚未开始的任务直接取消；已在运行的任务的HTTP请求会在截止时刻超时，结果将被丢弃
+                future.cancel()
+                tool_results[i] = f"{function_name}执行超时"
+                print(f"[DEBUG] 工具超时: {function_name}")
+            except Exception as e:
+                tool_results[i] = f"{function_name}执行失败: {str(e)}"
+                print(f"[DEBUG] 工具异常: {function_name}, {e}")
+        
+        return tool_results
+    
+    def _execute_tool_until(self, deadline, tool_name, arguments):
+        """在线程池中执行工具，工具发出的HTTP请求不晚于deadline结束"""
+        with get_http_client().deadline(deadline):
+            return self.execute_tool(tool_name, arguments)
+    
+    def _local_reply(self, reply, on_delta=None):
+        """不经过大模型的回复：同样流式回调并记入对话历史"""
+        if on_delta:
+            on_delta(reply)
+        self._append_history({"role": "assistant", "content": reply})
+        return reply
+    
+    def get_cache_stats(self):
+        """回复缓存的命中统计，未启用缓存时返回None"""
+        cache = get_response_cache()
+        return cache.stats() if cache else None
+    
+    def _try_fast_path(self, user_message):
+        """本地意图路由命中时直接执行工具并按模板回复，未命中返回None"""
+        route = self.intent_router.route(user_message)
+        if route is None:
+            return None
+        tool_name, arguments, template = route
+        if tool_name == "add_schedule":
+            arguments["original_message"] = user_message
+        print(f"[DEBUG] 快速通道命中: {tool_name}")
+        result = self.execute_tool(tool_name, arguments)
+        return template.format(result=result)
+    
+    def _request_completion(self, url, headers, data, on_delta=None):
+        """请求一次对话补全，提供on_delta时使用流式响应"""
+        if on_delta is None:
+            response = get_http_client().post(url, headers=headers, json=data)
+            print(f"[DEBUG] API响应状态: {response.status_code}")
+            return response.json()
+        return self._stream_completion(url, headers, data, on_delta)
+    
+    def _stream_completion(self, url, headers, data, on_delta):
+        """流式请求对话补全，逐段回调文本并重组tool_calls，返回与非流式一致的结构"""
+        response = get_http_client().post(url, headers=headers, json=dict(data, stream=True), stream=True)
+        print(f"[DEBUG] API响应状态: {response.status_code}")
+        if response.status_code != 200:
+            return response.json()
+        
+        # SSE默认按ISO-8859-1解码，这里强制使用UTF-8
+        response.encoding = 'utf-8'
+        content_parts = []
+        tool_calls = {}
+        
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == '[DONE]':
+                break
+            
+            chunk = json.loads(payload)
+            if 'error' in chunk:
+                return chunk
+            choices = chunk.get('choices') or []
+            if not choices:
+                continue
+            delta = choices[0].get('delta') or {}
+            
+            text = delta.get('content')
+            if text:
+                content_parts.append(text)
+                on_delta(text)
+            
+            # tool_calls按index分片下发，需要拼接名称和参数
+            for tool_call_delta in delta.get('tool_calls') or []:
+                slot = tool_calls.setdefault(tool_call_delta.get('index', 0), {
+                    "id": "",
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""}
+                })
+                if tool_call_delta.get('id'):
+                    slot['id'] = tool_call_delta['id']
+                function = tool_call_delta.get('function') or {}
+                if function.get('name'):
+                    slot['function']['name'] += function['name']
+                if function.get('arguments'):
+                    slot['function']['arguments'] += function['arguments']
+        
+        message = {"role": "assistant", "content": ''.join(content_parts) or None}
+        if tool_calls:
+            message['tool_calls'] = [tool_calls[index] for index in sorted(tool_calls)]
+        return {"choices": [{"message": message}]}
+    
+    def chat(self, user_message, on_delta=None):
+        """
+        与AI对话
+        :param on_delta: 可选的流式回调，每收到一段回复文本调用一次
+        """
         print(f"[DEBUG] 用户消息: {user_message}")
         
+        self._ensure_session()
+        
         # 添加系统提示（仅在对话开始时）
         if len(self.conversation_history) == 0:
-            system_prompt = {
-                "role": "system",
-                "content": "你是一个AI助手。重要规则：\n1. 当用户要求设置提醒时，必须立即调用add_schedule工具。时间参数支持相对时间格式（如'1小时后'、'30分钟后'、'10秒后'）。\n2. 当用户查询天气但没有指定城市时，你必须在一次响应中同时调用get_current_location和get_weather两个工具。\n3. 当用户要求修改提醒时，必须先调用find_schedule查找相关日程，然后调用update_schedule修改日程。\n4. 当用户要求删除提醒时，必须先调用find_schedule查找相关日程，然后调用delete_schedule删除日程。\n5. 当用户要求删除所有日程时，必须直接调用delete_all_schedules工具。"
-            }
-            self.conversation_history.append(system_prompt)
+            self.conversation_history.append({"role": "system", "content": SYSTEM_PROMPT})
         
         # 保存原始消息用于判断是否需要微信通知
         self.original_user_message = user_message
@@ -687,7 +871,28 @@ class AIWithTools:
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
         enhanced_message = f"[当前时间: {current_time}] {user_message}"
         
-        self.conversation_history.append({"role": "user", "content": enhanced_message})
+        self._append_history({"role": "user", "content": enhanced_message})
+        self.session_turns += 1
+        
+        # 简单指令走本地快速通道，不请求大模型
+        if config.INTENT_FAST_PATH_ENABLED:
+            fast_reply = self._try_fast_path(user_message)
+            if fast_reply is not None:
+                print(f"[DEBUG] 快速通道回复: {fast_reply}")
+                return self._local_reply(fast_reply, on_delta)
+        
+        # 查询回复缓存；本次运行（或清空历史后）已经有过对话时，"那明天呢"之类的追问依赖上文，不使用缓存
+        # 启动时恢复的上次会话不计入，重启后的重复提问仍可命中缓存
+        cache = get_response_cache()
+        cache_key = None
+        if cache and self.session_turns == 1:
+            # "今天有什么安排"等回复与日期相关，键中包含当天日期
+            state = [self.schedule.revision, datetime.now().strftime("%Y-%m-%d")]
+            cache_key = cache.make_key("chat", user_message, config.AI_MODEL, state)
+            cached_reply = cache.get(cache_key)
+            if cached_reply is not None:
+                print(f"[DEBUG] 命中回复缓存: {cache.stats()}")
+                return self._local_reply(cached_reply, on_delta)
         
         try:
             url = f"{config.SILICONFLOW_BASE_URL}/chat/completions"
@@ -695,17 +900,16 @@ class AIWithTools:
                 "Authorization": f"Bearer {config.SILICONFLOW_API_KEY}",
                 "Content-Type": "application/json"
             }
+            self.context.compact(self.conversation_history)
             data = {
                 "model": config.AI_MODEL,
-                "messages": self.conversation_history,
+                "messages": self.context.build_messages(self.conversation_history),
                 "tools": self.tools,
                 "max_tokens": 2000
             }
             
             print(f"[DEBUG] 发送API请求...")
-            response = requests.post(url, headers=headers, json=data)
-            result = response.json()
-            print(f"[DEBUG] API响应状态: {response.status_code}")
+            result = self._request_completion(url, headers, data, on_delta)
             
             if 'error' in result:
                 error_msg = f"API错误: {result['error'].get('message', '未知错误')}"
@@ -722,25 +926,19 @@ class AIWithTools:
             # 循环处理工具调用，支持多轮工具调用
             max_iterations = 5  # 最多5轮工具调用
             iteration = 0
+            used_tools = set()
             
             while message.get('tool_calls') and iteration < max_iterations:
                 iteration += 1
                 print(f"[DEBUG] 第{iteration}轮工具调用: {len(message['tool_calls'])}个")
                 
-                tool_results = []
-                for tool_call in message['tool_calls']:
-                    function_name = tool_call['function']['name']
-                    arguments = json.loads(tool_call['function']['arguments'])
-                    # 传递原始消息用于判断是否需要微信通知
-                    if function_name == "add_schedule":
-                        arguments["original_message"] = self.original_user_message
-                    result = self.execute_tool(function_name, arguments)
-                    tool_results.append(result)
+                used_tools.update(tool_call['function']['name'] for tool_call in message['tool_calls'])
+                tool_results = self.execute_tool_calls(message['tool_calls'])
                 
                 # 将工具调用结果添加到对话历史
-                self.conversation_history.append(message)
+                self._append_history(message)
                 for i, tool_call in enumerate(message['tool_calls']):
-                    self.conversation_history.append({
+                    self._append_history({
                         "role": "tool",
                         "tool_call_id": tool_call['id'],
                         "content": tool_results[i]
@@ -748,9 +946,9 @@ class AIWithTools:
                 
                 # 再次调用AI
                 print(f"[DEBUG] 发送第{iteration+1}次API请求...")
-                data['messages'] = self.conversation_history
-                response = requests.post(url, headers=headers, json=data)
-                result = response.json()
+                self.context.compact(self.conversation_history)
+                data['messages'] = self.context.build_messages(self.conversation_history)
+                result = self._request_completion(url, headers, data, on_delta)
                 
                 if 'error' in result:
                     error_msg = f"API错误: {result['error'].get('message', '未知错误')}"
@@ -769,8 +967,12 @@ class AIWithTools:
             if not final_message:
                 final_message = "操作已完成。"
             
-            self.conversation_history.append({"role": "assistant", "content": final_message})
+            self._append_history({"role": "assistant", "content": final_message})
             print(f"[DEBUG] 最终回复: {final_message}")
+            
+            # 只缓存完全由只读工具得出的回复，有效期取所用工具中最短的
+            if cache_key and used_tools and used_tools <= CACHEABLE_TOOL_TTLS.keys():
+                cache.set(cache_key, final_message, ttl=min(CACHEABLE_TOOL_TTLS[name] for name in used_tools))
             return final_message
             
                 
@@ -779,5 +981,90 @@ class AIWithTools:
             print(f"[DEBUG] 异常: {error_msg}")
             return error_msg
     
+    def ask_once(self, prompt, max_tokens=500):
+        """
+        单次问答：不带对话历史和工具，问答也不写入对话历史和对话记录
+        用于提醒润色等内部请求，避免它们作为用户消息出现在对话框历史和恢复的上下文中
+        """
+        url = f"{config.SILICONFLOW_BASE_URL}/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {config.SILICONFLOW_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": config.AI_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens
+        }
+        result = get_http_client().post(url, headers=headers, json=data).json()
+        if 'error' in result:
+            return f"API错误: {result['error'].get('message', '未知错误')}"
+        if 'choices' not in result:
+            return f"API响应格式错误: {result}"
+        return result['choices'][0]['message'].get('content') or ""
+    
+    def _summarize_history(self, previous_summary, dialogue):
+        """将移出上下文的旧对话与已有摘要合并成新摘要（在后台线程调用）"""
+        url = f"{config.SILICONFLOW_BASE_URL}/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {config.SILICONFLOW_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        prompt = f"已有摘要：\n{previous_summary or '无'}\n\n新增对话：\n{dialogue}"
+        data = {
+            "model": config.AI_MODEL,
+            "messages": [
+                {"role": "system", "content": "请把已有摘要和新增对话合并成一段简洁的对话摘要（300字以内），保留用户偏好、已完成的操作和未完成的事项，直接输出摘要。"},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": 500
+        }
+        result = get_http_client().post(url, headers=headers, json=data).json()
+        return result['choices'][0]['message']['content']
+    
+    def _ensure_session(self):
+        """懒加载会话：首次使用时恢复最近一次会话的最后若干条消息"""
+        if self.session_id is not None:
+            return
+        self.session_id = self.conversation_store.latest_session_id()
+        if self.session_id is None:
+            self.session_id = self.conversation_store.create_session()
+            return
+        
+        restored = self.conversation_store.load_recent(self.session_id, config.CONVERSATION_RESTORE_COUNT)
+        # 从一条用户消息开始恢复，避免工具结果缺少对应的工具调用
+        while restored and restored[0].get('role') != 'user':
+            restored.pop(0)
+        # 上次退出时未完成的工具调用也不恢复
+        while restored and restored[-1].get('tool_calls'):
+            restored.pop()
+        if restored:
+            self.conversation_history = [{"role": "system", "content": SYSTEM_PROMPT}] + restored
+            print(f"[DEBUG] 已恢复会话 {self.session_id} 的 {len(restored)} 条消息")
+    
+    def _append_history(self, message):
+        """追加消息到对话历史，并增量写入对话记录"""
+        self.conversation_history.append(message)
+        try:
+            self.conversation_store.append(self.session_id, message)
+        except Exception as e:
+            print(f"[DEBUG] 保存对话记录失败: {e}")
+    
+    def load_history_page(self, before_id=None, limit=20):
+        """
+        分页获取当前会话中用于显示的历史消息，按时间顺序
+        :param before_id: 只返回ID小于该值的消息，None表示最新一页
+        """
+        self._ensure_session()
+        messages = self.conversation_store.load_page(self.session_id, before_id, limit)
+        for message in messages:
+            if message['role'] == 'user':
+                message['content'] = TIME_PREFIX_PATTERN.sub('', message['content'])
+        return messages
+    
     def clear_history(self):
-        self.conversation_history = []
\ No newline at end of file
+        self.conversation_history = []
+        self.session_turns = 0
+        self.context.reset()
+        # 清空后开始新会话，旧会话仍保留在对话记录中
+        self.session_id = self.conversation_store.create_session()
\ No newline at end of file
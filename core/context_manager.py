@@ -0,0 +1,142 @@
+import json
+import re
+import threading
+
+# CJK字符（含全角标点）大约一个字一个token，其余字符大约4个一个token
+CJK_PATTERN = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+
+def estimate_tokens(text):
+    """粗略估算文本的token数，不依赖具体模型的分词器"""
+    if not text:
+        return 0
+    cjk_count = len(CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+class ContextManager:
+    """
+    对话上下文的token预算管理：
+    保留系统提示和最近几轮对话，较早轮次的工具结果先被截断，
+    仍超出预算时整轮移出历史，并在后台滚动合并进对话摘要
+    """
+    def __init__(self, token_budget, keep_turns=4, tokenizer=None, summarizer=None):
+        """
+        :param token_budget: 发送给模型的上下文token上限
+        :param keep_turns: 最近多少轮对话的工具结果保持原样
+        :param tokenizer: 可选的token计数函数 text -> int，默认使用estimate_tokens
+        :param summarizer: 可选的摘要函数 (旧摘要, 对话文本) -> 新摘要，为None时直接丢弃旧对话
+        """
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.tokenizer = tokenizer or estimate_tokens
+        self.summarizer = summarizer
+        self.summary = ""
+        self.pending_summary = []  # 等待合并进摘要的旧消息
+        self.summary_lock = threading.Lock()
+        self.summary_thread = None
+        self.generation = 0  # 每次reset递增，丢弃reset之前开始的摘要结果
+
+    def message_tokens(self, message):
+        """估算单条消息的token数（含少量格式开销）"""
+        tokens = 4 + self.tokenizer(message.get('content') or "")
+        for tool_call in message.get('tool_calls') or []:
+            tokens += self.tokenizer(json.dumps(tool_call.get('function', {}), ensure_ascii=False))
+        return tokens
+
+    def total_tokens(self, messages):
+        return sum(self.message_tokens(message) for message in messages)
+
+    @staticmethod
+    def _turn_starts(history):
+        """每轮对话（从用户消息开始）在历史中的起始下标"""
+        return [i for i, message in enumerate(history) if message.get('role') == 'user']
+
+    def compact(self, history):
+        """
+        原地压缩对话历史使其不超过预算，最后一轮（当前轮）始终保留
+        :param history: 以系统提示开头的消息列表
+        """
+        budget = self.token_budget - self.tokenizer(self.summary)
+        if self.total_tokens(history) <= budget:
+            return
+
+        # 第一步：截断较早轮次中的工具结果
+        turn_starts = self._turn_starts(history)
+        if len(turn_starts) > self.keep_turns:
+            boundary = turn_starts[-self.keep_turns]
+            for message in history[:boundary]:
+                if message.get('role') == 'tool' and message.get('content') != "[已省略较早的工具结果]":
+                    message['content'] = "[已省略较早的工具结果]"
+        if self.total_tokens(history) <= budget:
+            return
+
+        # 第二步：从最早一轮开始整轮移出，保证工具调用与结果成对
+        start = 1 if history and history[0].get('role') == 'system' else 0
+        dropped = []
+        while self.total_tokens(history) > budget:
+            turn_starts = [i for i in self._turn_starts(history) if i >= start]
+            if len(turn_starts) < 2:
+                break
+            dropped.extend(history[turn_starts[0]:turn_starts[1]])
+            del history[turn_starts[0]:turn_starts[1]]
+
+        if dropped:
+            print(f"[Context] 移出 {len(dropped)} 条较早消息，当前约 {self.total_tokens(history)} tokens")
+            self._schedule_summary(dropped)
+
+    def _schedule_summary(self, messages):
+        """后台将移出的消息合并进摘要"""
+        if not self.summarizer:
+            return
+        with self.summary_lock:
+            self.pending_summary.extend(messages)
+            if self.summary_thread is not None:
+                return
+            self.summary_thread = threading.Thread(target=self._summarize_pending, daemon=True)
+            self.summary_thread.start()
+
+    def _summarize_pending(self):
+        while True:
+            with self.summary_lock:
+                messages = self.pending_summary
+                self.pending_summary = []
+                if not messages:
+                    self.summary_thread = None
+                    return
+                generation = self.generation
+                previous_summary = self.summary
+
+            lines = []
+            for message in messages:
+                content = message.get('content')
+                if message.get('role') in ('user', 'assistant') and content:
+                    lines.append(f"{message['role']}: {content}")
+            if not lines:
+                continue
+
+            try:
+                summary = self.summarizer(previous_summary, "\n".join(lines))
+                if summary:
+                    with self.summary_lock:
+                        if generation != self.generation:
+                            # 生成期间已开始新会话，旧对话的摘要不能带入新会话
+                            print("[Context] 会话已重置，丢弃过期的对话摘要")
+                            continue
+                        self.summary = summary.strip()
+                    print(f"[Context] 对话摘要已更新: {self.summary[:50]}")
+            except Exception as e:
+                print(f"[Context] 生成摘要失败: {e}")
+
+    def build_messages(self, history):
+        """生成发送给模型的消息列表，在系统提示之后插入对话摘要"""
+        if not self.summary:
+            return history
+        summary_message = {"role": "system", "content": f"以下是之前对话的摘要：\n{self.summary}"}
+        if history and history[0].get('role') == 'system':
+            return [history[0], summary_message] + history[1:]
+        return [summary_message] + history
+
+    def reset(self):
+        with self.summary_lock:
+            self.generation += 1
+            self.summary = ""
+            self.pending_summary = []
@@ -0,0 +1,97 @@
+import sqlite3
+import json
+import uuid
+import threading
+from datetime import datetime
+
+class ConversationStore:
+    """
+    对话记录的持久化存储（SQLite）：每条消息单独追加写入，
+    按会话ID分组，支持快速读取最近N条和按ID向前分页
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.init_db()
+
+    def init_db(self):
+        with self.lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT,
+                    message TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            ''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at)")
+            self.conn.commit()
+
+    def create_session(self):
+        """创建新会话，返回会话ID"""
+        session_id = uuid.uuid4().hex
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            self.conn.execute("INSERT INTO sessions (id, created_at, updated_at) VALUES (?, ?, ?)", (session_id, now, now))
+            self.conn.commit()
+        return session_id
+
+    def latest_session_id(self):
+        """最近活跃的会话ID，没有会话时返回None"""
+        with self.lock:
+            row = self.conn.execute("SELECT id FROM sessions ORDER BY updated_at DESC, rowid DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def append(self, session_id, message):
+        """追加一条消息（完整消息以JSON保存，便于恢复tool_calls）"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO messages (session_id, role, content, message, created_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, message.get('role'), message.get('content'), json.dumps(message, ensure_ascii=False), now)
+            )
+            self.conn.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (now, session_id))
+            self.conn.commit()
+
+    def load_recent(self, session_id, limit):
+        """按时间顺序返回会话最近limit条完整消息"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT message FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def load_page(self, session_id, before_id=None, limit=20):
+        """
+        分页读取用于显示的用户/AI消息（不含工具消息），按时间顺序返回
+        :param before_id: 只返回ID小于该值的消息，None表示从最新一条开始
+        :return: [{"id", "role", "content", "created_at"}]
+        """
+        sql = "SELECT id, role, content, created_at FROM messages WHERE session_id = ? AND role IN ('user', 'assistant') AND content IS NOT NULL"
+        params = [session_id]
+        if before_id is not None:
+            sql += " AND id < ?"
+            params.append(before_id)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [{"id": row[0], "role": row[1], "content": row[2], "created_at": row[3]} for row in reversed(rows)]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,77 @@
+import re
+
+# 句首的礼貌用语和句尾标点，匹配前去掉
+PREFIX_PATTERN = re.compile(r'^(请|帮我|麻烦|给我)+')
+SUFFIX_PATTERN = re.compile(r'[\s。！？!?，,.~～吧呀啊哦]+$')
+
+CHINESE_DIGITS = {'零': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+
+def parse_number(text):
+    """解析阿拉伯数字或一百以内的中文数字，无法解析时返回None"""
+    if text.isdigit():
+        return int(text)
+    if text == '十':
+        return 10
+    if '十' in text:
+        tens, _, ones = text.partition('十')
+        tens_value = CHINESE_DIGITS.get(tens, 1) if tens else 1
+        ones_value = CHINESE_DIGITS.get(ones, 0) if ones else 0
+        if (tens and tens not in CHINESE_DIGITS) or (ones and ones not in CHINESE_DIGITS):
+            return None
+        return tens_value * 10 + ones_value
+    if len(text) == 1 and text in CHINESE_DIGITS:
+        return CHINESE_DIGITS[text]
+    return None
+
+class IntentRouter:
+    """
+    本地意图路由：用整句匹配的规则识别高置信度的简单指令，
+    直接映射到工具调用，无法匹配时返回None交给大模型处理
+    """
+    MEDIA_ACTIONS = [
+        (re.compile(r'^(播放)?下一(首|曲)(歌)?$|^切歌$'), "下一首"),
+        (re.compile(r'^(播放)?上一(首|曲)(歌)?$'), "上一首"),
+        (re.compile(r'^暂停(音乐|播放|一下)?$'), "暂停"),
+        # 单独的"继续"通常是让助手接着说，交给大模型处理
+        (re.compile(r'^(继续|开始)?播放(音乐)?$'), "播放"),
+        (re.compile(r'^(把)?(音量|声音)(调|加|增)?大(一)?(点)?$|^大声(一)?点$'), "音量增大"),
+        (re.compile(r'^(把)?(音量|声音)((调|减)?小(一)?(点)?|降低)$|^小声(一)?点$'), "音量减小")
+    ]
+    TIME_PATTERN = re.compile(r'^(现在|当前)?(是)?(几点(了|钟)?|什么时间(了)?|多少点(了)?)$')
+    WEBSITE_PATTERN = re.compile(r'^打开(网页|网站|网址)\s*((https?://)?[\w-]+(\.[\w-]+)+(/\S*)?)$', re.IGNORECASE)
+    REMINDER_PATTERN = re.compile(r'^(\d+|[零一二两三四五六七八九十]+)\s*(秒|分钟|分|小时|个小时)(钟)?(以)?后提醒我(.+)$')
+
+    def normalize(self, text):
+        text = text.strip()
+        text = SUFFIX_PATTERN.sub('', text)
+        return PREFIX_PATTERN.sub('', text)
+
+    def route(self, text):
+        """
+        匹配用户指令
+        :return: (工具名, 参数, 回复模板) 或 None；回复模板中的{result}替换为工具返回值
+        """
+        text = self.normalize(text)
+        if not text:
+            return None
+
+        if self.TIME_PATTERN.match(text):
+            return "get_current_time", {}, "{result}"
+
+        for pattern, action in self.MEDIA_ACTIONS:
+            if pattern.match(text):
+                return "media_control", {"action": action}, "{result}"
+
+        match = self.WEBSITE_PATTERN.match(text)
+        if match:
+            return "open_website", {"url": match.group(2)}, "{result}"
+
+        match = self.REMINDER_PATTERN.match(text)
+        if match:
+            amount = parse_number(match.group(1))
+            task = match.group(5).strip()
+            if amount and task:
+                unit = {"秒": "秒", "分钟": "分钟", "分": "分钟", "小时": "小时", "个小时": "小时"}[match.group(2)]
+                return "add_schedule", {"time": f"{amount}{unit}后", "task": task}, "好的，{result}"
+
+        return None
@@ -1,5 +1,6 @@
-import sqlite3
 import time
+import heapq
+import itertools
 from datetime import datetime
 import threading
 import config
@@ -7,10 +8,30 @@ import subprocess
 import sys
 import os
 from services.pushplus_service import PushPlusService
+from services.response_cache import get_response_cache
+from .schedule_store import ScheduleStore
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'  # 数据库中日程时间的标准格式
+# 大模型可能给出的其他时间写法，解析后统一转换为标准格式
+DATETIME_INPUT_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M')
+
+def parse_datetime(text):
+    """宽松解析日程时间（支持省略秒、斜杠日期和ISO格式），无法解析时返回None"""
+    text = (text or '').strip()
+    for fmt in DATETIME_INPUT_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(text).replace(tzinfo=None)
+    except ValueError:
+        return None
 
 class ScheduleManager:
     def __init__(self):
         self.db_path = config.SCHEDULE_DB
+        self.store = ScheduleStore(self.db_path)
         self.init_db()
         self.running = False
         self.speak_callback = None
@@ -19,6 +40,12 @@ class ScheduleManager:
         self.reminder_counts = {}  # 记录每个日程的提醒次数
         self.load_reminded_schedules()  # 加载已提醒的日程
         self.pushplus = PushPlusService()  # PushPlus通知服务
+        self.last_remind_time = {}  # 记录每个日程的最后提醒时间
+        # 定时器：按下一次触发时间排序的小顶堆，元素为(触发时间戳, 序号, 日程)
+        self.timer_heap = []
+        self.timer_seq = itertools.count()
+        self.timer_dirty = True  # 日程增删改后置位，调度线程据此重建堆
+        self.timer_cond = threading.Condition()
         
     def set_speak_callback(self, callback):
         self.speak_callback = callback
@@ -27,8 +54,19 @@ class ScheduleManager:
         self.ai_chat_callback = callback
         
     def init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.store.transaction() as conn:
+            self._migrate(conn.cursor())
+        self.store.ensure_indexes()
+        self.store.ensure_revision()
+        self.fts_enabled = self.store.ensure_fts()
+    
+    @property
+    def revision(self):
+        """日程数据版本号，每次增删改递增并保存在数据库中，用于回复缓存失效"""
+        return self.store.revision()
+    
+    def _migrate(self, cursor):
+        """创建日程表或迁移旧版本表结构"""
         
         # 检查表是否存在以及列结构
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='schedules'")
@@ -102,111 +140,82 @@ class ScheduleManager:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
-        
-        conn.commit()
-        conn.close()
     
     def load_reminded_schedules(self):
         """加载已提醒过的日程，并自动标记所有过期日程为已提醒"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
         try:
             # 加载已标记为提醒的日程
-            cursor.execute('SELECT datetime, task FROM schedules WHERE reminded = 1')
-            for row in cursor.fetchall():
+            for row in self.store.query('SELECT datetime, task FROM schedules WHERE reminded = 1'):
                 task_id = f"{row[0]}-{row[1]}"
                 self.reminded_schedules.add(task_id)
             
             # 自动标记所有过期的日程为已提醒（避免启动时重复提醒）
-            cursor.execute('SELECT datetime, task FROM schedules WHERE datetime < ? AND reminded = 0', (now,))
-            expired_schedules = cursor.fetchall()
+            expired_schedules = self.store.query('SELECT datetime, task FROM schedules WHERE datetime < ? AND reminded = 0', (now,))
             
-            for row in expired_schedules:
-                datetime_str, task = row
+            for datetime_str, task in expired_schedules:
                 task_id = f"{datetime_str}-{task}"
                 self.reminded_schedules.add(task_id)
-                # 更新数据库
-                cursor.execute('UPDATE schedules SET reminded = 1 WHERE datetime = ? AND task = ?', (datetime_str, task))
             
             if expired_schedules:
-                conn.commit()
+                # 批量更新数据库，一次提交
+                self.store.executemany('UPDATE schedules SET reminded = 1 WHERE datetime = ? AND task = ?', expired_schedules)
                 print(f"[Schedule] 自动标记了 {len(expired_schedules)} 个过期日程为已提醒")
         except Exception as e:
             print(f"[Schedule Error] 加载日程失败: {e}")
-        
-        conn.close()
     
     def mark_as_reminded(self, datetime_str, task):
         """标记日程为已提醒"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE schedules SET reminded = 1 WHERE datetime = ? AND task = ?', (datetime_str, task))
-        conn.commit()
-        conn.close()
+        self.store.execute('UPDATE schedules SET reminded = 1 WHERE datetime = ? AND task = ?', (datetime_str, task))
     
     def load_schedules(self, limit=None, future_only=False, date_filter=None):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         if date_filter:
             # 获取指定日期的日程
             date_start = f"{date_filter} 00:00:00"
             date_end = f"{date_filter} 23:59:59"
-            cursor.execute('SELECT datetime, task, pushplus_notify, repeat_type FROM schedules WHERE datetime >= ? AND datetime <= ? AND reminded = 0 ORDER BY datetime', (date_start, date_end))
+            rows = self.store.query('SELECT datetime, task, pushplus_notify, repeat_type FROM schedules WHERE datetime >= ? AND datetime <= ? AND reminded = 0 ORDER BY datetime', (date_start, date_end))
         elif future_only:
             # 只获取未来的日程
             now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             if limit:
-                cursor.execute('SELECT datetime, task, pushplus_notify, repeat_type FROM schedules WHERE datetime >= ? AND reminded = 0 ORDER BY datetime LIMIT ?', (now, limit))
+                rows = self.store.query('SELECT datetime, task, pushplus_notify, repeat_type FROM schedules WHERE datetime >= ? AND reminded = 0 ORDER BY datetime LIMIT ?', (now, limit))
             else:
-                cursor.execute('SELECT datetime, task, pushplus_notify, repeat_type FROM schedules WHERE datetime >= ? AND reminded = 0 ORDER BY datetime', (now,))
+                rows = self.store.query('SELECT datetime, task, pushplus_notify, repeat_type FROM schedules WHERE datetime >= ? AND reminded = 0 ORDER BY datetime', (now,))
         else:
             if limit:
-                cursor.execute('SELECT datetime, task, pushplus_notify, repeat_type FROM schedules WHERE reminded = 0 ORDER BY datetime LIMIT ?', (limit,))
+                rows = self.store.query('SELECT datetime, task, pushplus_notify, repeat_type FROM schedules WHERE reminded = 0 ORDER BY datetime LIMIT ?', (limit,))
             else:
-                cursor.execute('SELECT datetime, task, pushplus_notify, repeat_type FROM schedules WHERE reminded = 0 ORDER BY datetime')
+                rows = self.store.query('SELECT datetime, task, pushplus_notify, repeat_type FROM schedules WHERE reminded = 0 ORDER BY datetime')
         
-        schedules = [{"datetime": row[0], "task": row[1], "pushplus_notify": row[2] if len(row) > 2 else 0, "repeat_type": row[3] if len(row) > 3 else 'once'} for row in cursor.fetchall()]
-        conn.close()
+        schedules = [{"datetime": row[0], "task": row[1], "pushplus_notify": row[2] if len(row) > 2 else 0, "repeat_type": row[3] if len(row) > 3 else 'once'} for row in rows]
         return schedules
     
+    def load_history(self, limit=20):
+        """获取已过期的历史日程，按时间倒序"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = self.store.query('SELECT datetime, task, repeat_type FROM schedules WHERE datetime < ? ORDER BY datetime DESC LIMIT ?', (now, limit))
+        return [{"datetime": row[0], "task": row[1], "repeat_type": row[2]} for row in rows]
+    
+    def get_schedule_dates(self, start_date, end_date):
+        """获取[start_date, end_date)范围内有日程的日期列表"""
+        rows = self.store.query('SELECT DISTINCT DATE(datetime) FROM schedules WHERE datetime >= ? AND datetime < ?', (start_date, end_date))
+        return [row[0] for row in rows]
+    
     def update_schedule(self, old_datetime, old_task, new_datetime, new_task):
         """修改日程"""
         print(f"[DEBUG] 修改日程: 原时间={old_datetime}, 原任务={old_task} -> 新时间={new_datetime}, 新任务={new_task}")
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 将时间字符串转换为完整的日期时间
-        now = datetime.now()
-        try:
-            # 尝试解析时间
-            time_parts = new_datetime.split(':')
-            if len(time_parts) == 3:
-                hour, minute, second = map(int, time_parts)
-                schedule_datetime = now.replace(hour=hour, minute=minute, second=second, microsecond=0)
-                # 如果时间已过，设置为明天
-                if schedule_datetime < now:
-                    from datetime import timedelta
-                    schedule_datetime += timedelta(days=1)
-                new_datetime_str = schedule_datetime.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                new_datetime_str = new_datetime
-        except:
-            new_datetime_str = new_datetime
+        new_datetime_str = self._normalize_datetime(new_datetime)
         
-        cursor.execute('UPDATE schedules SET datetime = ?, task = ? WHERE datetime = ? AND task = ?',
-                     (new_datetime_str, new_task, old_datetime, old_task))
-        conn.commit()
-        rows_affected = cursor.rowcount
-        conn.close()
+        rows_affected = self.store.execute('UPDATE schedules SET datetime = ?, task = ? WHERE datetime = ? AND task = ?',
+                                           (new_datetime_str, new_task, old_datetime, old_task))
         
         if rows_affected > 0:
             # 如果修改成功，从已提醒集合中移除旧的日程ID
             old_task_id = f"{old_datetime}-{old_task}"
             self.reminded_schedules.discard(old_task_id)
+            self.invalidate_timers()
             print(f"[DEBUG] 日程修改成功: {new_datetime_str} {new_task}")
             return True
         else:
@@ -217,55 +226,85 @@ class ScheduleManager:
         """删除日程"""
         print(f"[DEBUG] 删除日程: 时间={datetime_str}, 任务={task}")
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM schedules WHERE datetime = ? AND task = ?', (datetime_str, task))
-        conn.commit()
-        rows_affected = cursor.rowcount
-        conn.close()
+        rows_affected = self.store.execute('DELETE FROM schedules WHERE datetime = ? AND task = ?', (datetime_str, task))
         
         if rows_affected > 0:
             # 从已提醒集合中移除
             task_id = f"{datetime_str}-{task}"
             self.reminded_schedules.discard(task_id)
+            self.invalidate_timers()
             print(f"[DEBUG] 日程删除成功: {datetime_str} {task}")
             return True
         else:
             print(f"[DEBUG] 未找到匹配的日程: {datetime_str} {task}")
             return False
     
-    def find_schedules(self, task_keyword=None, datetime_str=None):
-        """查找日程，支持按任务关键词或时间查找"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if task_keyword and datetime_str:
-            cursor.execute('SELECT datetime, task FROM schedules WHERE task LIKE ? AND datetime = ?',
-                         (f'%{task_keyword}%', datetime_str))
-        elif task_keyword:
-            cursor.execute('SELECT datetime, task FROM schedules WHERE task LIKE ?', (f'%{task_keyword}%',))
-        elif datetime_str:
-            cursor.execute('SELECT datetime, task FROM schedules WHERE datetime = ?', (datetime_str,))
+    def find_schedules(self, task_keyword=None, datetime_str=None, start_datetime=None, end_datetime=None, fuzzy=False, limit=None):
+        """
+        查找日程，支持按任务关键词、精确时间或时间范围查找
+        :param fuzzy: 为True时按关键词的三字片段模糊匹配，结果按相关度排序
+        :param start_datetime/end_datetime: 时间范围（含边界），可以只写日期
+        """
+        conditions = []
+        params = []
+        if datetime_str:
+            conditions.append('s.datetime = ?')
+            params.append(datetime_str)
+        if start_datetime:
+            conditions.append('s.datetime >= ?')
+            params.append(start_datetime)
+        if end_datetime:
+            # 只有日期时包含当天全部时间
+            if len(end_datetime) == 10:
+                end_datetime = f"{end_datetime} 23:59:59"
+            conditions.append('s.datetime <= ?')
+            params.append(end_datetime)
+        
+        # trigram索引需要至少3个字符，更短的关键词回退到LIKE
+        if task_keyword and self.fts_enabled and len(task_keyword) >= 3:
+            match_query = self._build_match_query(task_keyword, fuzzy)
+            sql = 'SELECT s.datetime, s.task FROM schedules_fts f JOIN schedules s ON s.id = f.rowid WHERE schedules_fts MATCH ?'
+            params.insert(0, match_query)
+            for condition in conditions:
+                sql += f' AND {condition}'
+            sql += ' ORDER BY f.rank'
         else:
-            cursor.execute('SELECT datetime, task FROM schedules')
+            if task_keyword:
+                conditions.insert(0, 's.task LIKE ?')
+                params.insert(0, f'%{task_keyword}%')
+            sql = 'SELECT s.datetime, s.task FROM schedules s'
+            if conditions:
+                sql += ' WHERE ' + ' AND '.join(conditions)
+            sql += ' ORDER BY s.datetime'
+        
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
         
-        schedules = [{"datetime": row[0], "task": row[1]} for row in cursor.fetchall()]
-        conn.close()
+        rows = self.store.query(sql, params)
+        schedules = [{"datetime": row[0], "task": row[1]} for row in rows]
         return schedules
     
+    @staticmethod
+    def _build_match_query(keyword, fuzzy):
+        """构造FTS5查询：精确模式为整词短语（子串匹配），模糊模式为各三字片段的OR"""
+        def quote(text):
+            return '"' + text.replace('"', '""') + '"'
+        
+        if not fuzzy:
+            return quote(keyword)
+        trigrams = {keyword[i:i + 3] for i in range(len(keyword) - 2)}
+        return ' OR '.join(quote(trigram) for trigram in sorted(trigrams))
+    
     def delete_all_schedules(self):
         """删除所有日程"""
         print("[DEBUG] 删除所有日程")
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM schedules')
-        conn.commit()
-        rows_affected = cursor.rowcount
-        conn.close()
+        rows_affected = self.store.execute('DELETE FROM schedules')
         
         # 清空已提醒集合
         self.reminded_schedules.clear()
+        self.invalidate_timers()
         
         print(f"[DEBUG] 已删除 {rows_affected} 个日程")
         return rows_affected
@@ -273,37 +312,48 @@ class ScheduleManager:
     def add_schedule(self, time_str, task, pushplus_notify=False, repeat_type='once'):
         print(f"[DEBUG] 添加日程: 时间={time_str}, 任务={task}, 微信通知={pushplus_notify}, 重复类型={repeat_type}")
         
-        # 将时间字符串转换为完整的日期时间
+        datetime_str = self._normalize_datetime(time_str)
+        
+        self.store.execute('INSERT INTO schedules (datetime, task, pushplus_notify, repeat_type) VALUES (?, ?, ?, ?)',
+                           (datetime_str, task, 1 if pushplus_notify else 0, repeat_type))
+        self.invalidate_timers()
+        print(f"[DEBUG] 日程已存入数据库: {datetime_str}, 重复类型: {repeat_type}")
+    
+    @staticmethod
+    def _normalize_datetime(time_str):
+        """
+        把时间字符串转换为标准格式的完整日期时间
+        只有时间（HH:MM:SS或HH:MM）时取今天，已过则取明天；无法解析时原样保存并给出警告
+        """
         now = datetime.now()
-        try:
-            # 尝试解析时间
-            time_parts = time_str.split(':')
-            if len(time_parts) == 3:
-                hour, minute, second = map(int, time_parts)
+        time_parts = time_str.strip().split(':')
+        if len(time_parts) in (2, 3) and all(part.isdigit() for part in time_parts):
+            hour, minute, second = (list(map(int, time_parts)) + [0])[:3]
+            try:
                 schedule_datetime = now.replace(hour=hour, minute=minute, second=second, microsecond=0)
+            except ValueError:
+                schedule_datetime = None
+            if schedule_datetime is not None:
                 # 如果时间已过，设置为明天
                 if schedule_datetime < now:
                     from datetime import timedelta
                     schedule_datetime += timedelta(days=1)
-                datetime_str = schedule_datetime.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                datetime_str = time_str
-        except:
-            datetime_str = time_str
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('INSERT INTO schedules (datetime, task, pushplus_notify, repeat_type) VALUES (?, ?, ?, ?)',
-                      (datetime_str, task, 1 if pushplus_notify else 0, repeat_type))
-        conn.commit()
-        conn.close()
-        print(f"[DEBUG] 日程已存入数据库: {datetime_str}, 重复类型: {repeat_type}")
+                return schedule_datetime.strftime(DATETIME_FORMAT)
+        
+        schedule_datetime = parse_datetime(time_str)
+        if schedule_datetime is None:
+            print(f"[Schedule警告] 无法解析日程时间，按原样保存: {time_str}")
+            return time_str
+        return schedule_datetime.strftime(DATETIME_FORMAT)
     
     def create_next_repeat_schedule(self, current_datetime_str, task, pushplus_notify, repeat_type):
         """为重复日程创建下一次提醒"""
         from datetime import timedelta
         try:
-            current_dt = datetime.strptime(current_datetime_str, '%Y-%m-%d %H:%M:%S')
+            current_dt = parse_datetime(current_datetime_str)
+            if current_dt is None:
+                print(f"[Schedule警告] 无法解析日程时间，未创建重复日程: {current_datetime_str}")
+                return
             
             if repeat_type == 'daily':
                 next_dt = current_dt + timedelta(days=1)
@@ -317,14 +367,11 @@ class ScheduleManager:
             else:
                 return
             
-            next_datetime_str = next_dt.strftime('%Y-%m-%d %H:%M:%S')
+            next_datetime_str = next_dt.strftime(DATETIME_FORMAT)
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('INSERT INTO schedules (datetime, task, pushplus_notify, repeat_type) VALUES (?, ?, ?, ?)',
-                          (next_datetime_str, task, 1 if pushplus_notify else 0, repeat_type))
-            conn.commit()
-            conn.close()
+            self.store.execute('INSERT INTO schedules (datetime, task, pushplus_notify, repeat_type) VALUES (?, ?, ?, ?)',
+                               (next_datetime_str, task, 1 if pushplus_notify else 0, repeat_type))
+            self.invalidate_timers()
             print(f"[DEBUG] 创建下一次重复日程: {next_datetime_str}, 类型: {repeat_type}")
         except Exception as e:
             print(f"[ERROR] 创建重复日程失败: {e}")
@@ -332,7 +379,14 @@ class ScheduleManager:
     def remind(self, task, pushplus_notify=False):
         # AI润色提醒文本
         polished_text = f"提醒：{task}"
-        if self.ai_chat_callback:
+        # 相同任务（如每日重复提醒）的润色结果直接复用
+        cache = get_response_cache()
+        cache_key = cache.make_key("remind_polish", task, config.AI_MODEL) if cache else None
+        cached_text = cache.get(cache_key) if cache else None
+        if cached_text:
+            polished_text = cached_text
+            print(f"[AI润色] 使用缓存: {polished_text}")
+        elif self.ai_chat_callback:
             try:
                 prompt = f"请以专业秘书的口吻，将以下提醒内容润色成完整的提醒语句。要求：1)必须包含完整的提醒内容 2)语气礼貌专业 3)直接输出润色后的语句，不要有任何解释或多余文字。提醒内容：{task}"
                 ai_response = self.ai_chat_callback(prompt)
@@ -352,6 +406,8 @@ class ScheduleManager:
                 # 确保文本不为空
                 if not polished_text or len(polished_text.strip()) == 0:
                     polished_text = f"提醒：{task}"
+                elif cache and not ai_response.startswith(("AI对话失败", "API错误", "API响应格式错误")):
+                    cache.set(cache_key, polished_text, ttl=config.REMIND_POLISH_CACHE_TTL)
                 
                 print(f"[AI润色] {polished_text}")
             except Exception as e:
@@ -404,70 +460,99 @@ class ScheduleManager:
         print(f"时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("=" * 50)
         
+    def invalidate_timers(self):
+        """日程发生变化，通知调度线程重建定时器堆"""
+        with self.timer_cond:
+            self.timer_dirty = True
+            self.timer_cond.notify()
+    
+    def _next_fire_time(self, item):
+        """计算日程的下一次触发时间戳，无法解析时返回None"""
+        task_id = f"{item['datetime']}-{item['task']}"
+        if task_id in self.reminded_schedules:
+            return None
+        if self.reminder_counts.get(task_id, 0) > 0 and task_id in self.last_remind_time:
+            # 重复提醒：距离上次提醒间隔REMINDER_REPEAT_INTERVAL秒
+            return self.last_remind_time[task_id] + config.REMINDER_REPEAT_INTERVAL
+        schedule_datetime = parse_datetime(item['datetime'])
+        if schedule_datetime is None:
+            print(f"[Schedule警告] 无法解析日程时间，该日程不会提醒: {item['datetime']} {item['task']}")
+            return None
+        return schedule_datetime.timestamp()
+    
+    def _rebuild_timers(self):
+        """从数据库重建定时器堆，调用方需持有timer_cond"""
+        self.timer_heap = []
+        for item in self.load_schedules():
+            fire_time = self._next_fire_time(item)
+            if fire_time is not None:
+                self.timer_heap.append((fire_time, next(self.timer_seq), item))
+        heapq.heapify(self.timer_heap)
+        self.timer_dirty = False
+    
+    def _fire(self, item):
+        """触发一次提醒，返回该日程是否还需要再次提醒"""
+        schedule_datetime = item['datetime']
+        task = item['task']
+        pushplus_notify = item.get('pushplus_notify', 0)
+        repeat_type = item.get('repeat_type', 'once')
+        task_id = f"{schedule_datetime}-{task}"
+        
+        current_count = self.reminder_counts.get(task_id, 0)
+        try:
+            self.remind(task, pushplus_notify=bool(pushplus_notify))
+        except Exception as e:
+            print(f"[Schedule Error] 提醒失败: {e}")
+        self.reminder_counts[task_id] = current_count + 1
+        self.last_remind_time[task_id] = time.time()
+        
+        # 达到重复次数后标记为已提醒
+        if self.reminder_counts[task_id] >= config.REMINDER_REPEAT_COUNT:
+            self.reminded_schedules.add(task_id)
+            # 标记已提醒和创建下一次重复日程合并为一次提交
+            with self.store.transaction():
+                self.mark_as_reminded(schedule_datetime, task)
+                
+                # 如果是重复日程，创建下一次提醒
+                if repeat_type != 'once':
+                    self.create_next_repeat_schedule(schedule_datetime, task, pushplus_notify, repeat_type)
+            return False
+        return True
+    
     def start(self):
         self.running = True
         
         def run():
-            last_remind_time = {}  # 记录每个任务的最后提醒时间
+            # 最长等待时间，防止系统休眠或修改时钟后错过触发
+            max_wait = 60
             
             while self.running:
-                schedules = self.load_schedules()
-                now = datetime.now()
-                current_datetime_str = now.strftime('%Y-%m-%d %H:%M:%S')
-                
-                for item in schedules:
-                    schedule_datetime = item['datetime']
-                    task = item['task']
-                    pushplus_notify = item.get('pushplus_notify', 0)
-                    repeat_type = item.get('repeat_type', 'once')
-                    task_id = f"{schedule_datetime}-{task}"
+                with self.timer_cond:
+                    if self.timer_dirty:
+                        self._rebuild_timers()
+                    
+                    if not self.timer_heap:
+                        self.timer_cond.wait(timeout=max_wait)
+                        continue
                     
-                    # 如果已经完成所有提醒，跳过
-                    if task_id in self.reminded_schedules:
+                    wait = self.timer_heap[0][0] - time.time()
+                    if wait > 0:
+                        self.timer_cond.wait(timeout=min(wait, max_wait))
                         continue
                     
-                    # 检查是否到达提醒时间
-                    if schedule_datetime <= current_datetime_str:
-                        # 获取当前提醒次数
-                        current_count = self.reminder_counts.get(task_id, 0)
-                        
-                        # 如果还没达到重复次数
-                        if current_count < config.REMINDER_REPEAT_COUNT:
-                            should_remind = False
-                            
-                            if current_count == 0:
-                                # 首次提醒
-                                should_remind = True
-                            else:
-                                # 检查距离上次提醒是否已过间隔时间
-                                if task_id in last_remind_time:
-                                    elapsed = (now - last_remind_time[task_id]).total_seconds()
-                                    if elapsed >= config.REMINDER_REPEAT_INTERVAL:
-                                        should_remind = True
-                                else:
-                                    # 如果没有上次提醒时间，也提醒（防止数据丢失）
-                                    should_remind = True
-                            
-                            if should_remind:
-                                try:
-                                    self.remind(task, pushplus_notify=bool(pushplus_notify))
-                                    self.reminder_counts[task_id] = current_count + 1
-                                    last_remind_time[task_id] = now
-                                    
-                                    # 达到重复次数后标记为已提醒
-                                    if self.reminder_counts[task_id] >= config.REMINDER_REPEAT_COUNT:
-                                        self.reminded_schedules.add(task_id)
-                                        self.mark_as_reminded(schedule_datetime, task)
-                                        
-                                        # 如果是重复日程，创建下一次提醒
-                                        if repeat_type != 'once':
-                                            self.create_next_repeat_schedule(schedule_datetime, task, pushplus_notify, repeat_type)
-                                except Exception as e:
-                                    print(f"[Schedule Error] 提醒失败: {e}")
+                    _, _, item = heapq.heappop(self.timer_heap)
                 
-                time.sleep(1)
+                # 在锁外执行提醒，避免AI润色和语音播报阻塞日程增删改
+                if self._fire(item):
+                    fire_time = self._next_fire_time(item)
+                    with self.timer_cond:
+                        # 堆待重建时会从数据库重新加入该日程，这里不再重复放入
+                        if fire_time is not None and not self.timer_dirty:
+                            heapq.heappush(self.timer_heap, (fire_time, next(self.timer_seq), item))
         
         threading.Thread(target=run, daemon=True).start()
     
     def stop(self):
-        self.running = False
\ No newline at end of file
+        with self.timer_cond:
+            self.running = False
+            self.timer_cond.notify()
@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+class ScheduleStore:
+    """
+    日程数据库访问层：整个进程共享一个长连接（WAL模式），
+    调度线程、AI工具线程和GUI通过同一把锁串行访问
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.transaction_depth = 0
+        # cached_statements让重复执行的SQL复用已编译的语句
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=128)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    def ensure_indexes(self):
+        """创建常用查询所需的索引"""
+        with self.transaction():
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_schedules_reminded_datetime ON schedules(reminded, datetime)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_schedules_task ON schedules(task)")
+
+    def ensure_fts(self):
+        """
+        创建任务内容的FTS5全文索引（trigram分词，支持中文子串匹配），通过触发器与schedules表保持同步
+        当前SQLite不支持FTS5或trigram时返回False，调用方回退到LIKE查询
+        """
+        try:
+            with self.transaction() as conn:
+                exists = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='schedules_fts'").fetchone()
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS schedules_fts USING fts5(task, content='schedules', content_rowid='id', tokenize='trigram')")
+                conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS schedules_fts_insert AFTER INSERT ON schedules BEGIN
+                        INSERT INTO schedules_fts(rowid, task) VALUES (new.id, new.task);
+                    END
+                """)
+                conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS schedules_fts_delete AFTER DELETE ON schedules BEGIN
+                        INSERT INTO schedules_fts(schedules_fts, rowid, task) VALUES ('delete', old.id, old.task);
+                    END
+                """)
+                conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS schedules_fts_update AFTER UPDATE OF task ON schedules BEGIN
+                        INSERT INTO schedules_fts(schedules_fts, rowid, task) VALUES ('delete', old.id, old.task);
+                        INSERT INTO schedules_fts(rowid, task) VALUES (new.id, new.task);
+                    END
+                """)
+                if not exists:
+                    # 首次创建时为已有日程建立索引
+                    conn.execute("INSERT INTO schedules_fts(schedules_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.OperationalError as e:
+            print(f"[Schedule] 全文索引不可用，使用LIKE查询: {e}")
+            return False
+
+    def ensure_revision(self):
+        """
+        创建日程版本号：schedules表的增删改由触发器在同一写事务内递增版本号，
+        版本号保存在数据库中，重启后不会归零，持久化的回复缓存据此失效
+        """
+        with self.transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS schedule_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO schedule_meta (key, value) VALUES ('revision', 0)")
+            # 标记已提醒不影响日程内容，只在修改时间或任务时递增
+            for name, event in (("insert", "INSERT"), ("delete", "DELETE"), ("update", "UPDATE OF datetime, task")):
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS schedules_revision_{name} AFTER {event} ON schedules BEGIN
+                        UPDATE schedule_meta SET value = value + 1 WHERE key = 'revision';
+                    END
+                """)
+
+    def revision(self):
+        """当前日程版本号"""
+        row = self.query_one("SELECT value FROM schedule_meta WHERE key = 'revision'")
+        return row[0] if row else 0
+
+    @contextmanager
+    def transaction(self):
+        """
+        将多条写操作合并为一次提交，可嵌套，最外层退出时提交
+        出现异常时回滚整个事务
+        """
+        with self.lock:
+            self.transaction_depth += 1
+            try:
+                yield self.conn
+            except Exception:
+                self.transaction_depth -= 1
+                if self.transaction_depth == 0:
+                    self.conn.rollback()
+                raise
+            self.transaction_depth -= 1
+            if self.transaction_depth == 0:
+                self.conn.commit()
+
+    def query(self, sql, params=()):
+        """执行查询，返回所有行"""
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        """执行查询，返回第一行"""
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def execute(self, sql, params=()):
+        """执行写操作，返回受影响的行数"""
+        with self.transaction() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def executemany(self, sql, seq_of_params):
+        """批量执行写操作，一次提交，返回受影响的行数"""
+        with self.transaction() as conn:
+            return conn.executemany(sql, seq_of_params).rowcount
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,14 +1,16 @@
 from PyQt5.QtWidgets import (QApplication, QWidget, QMenu, QAction, QTextEdit,
                              QVBoxLayout, QDialog, QPushButton, QLineEdit, QLabel, QFormLayout, QListWidget, QHBoxLayout, QSlider, QColorDialog, QComboBox, QStackedWidget, QFrame, QCalendarWidget, QGridLayout)
 from PyQt5.QtCore import Qt, QPoint, QTimer, pyqtSignal, QObject, QDate
-from PyQt5.QtGui import QPainter, QColor, QBrush, QPen, QFont, QRegion, QIcon, QKeyEvent, QTextCharFormat
+from PyQt5.QtGui import QPainter, QColor, QBrush, QPen, QFont, QRegion, QIcon, QKeyEvent, QTextCharFormat, QTextCursor
 import sys
 import threading
+import time
 import config
 from core.ai_core_with_tools import AIWithTools
 from core.schedule_manager import ScheduleManager
 from services.hotkey_manager import HotkeyManager
 from services.wake_word_detector import WakeWordDetector
+from services.vosk_model import get_vosk_model_manager
 from services.tts_service import TTSService
 
 def get_theme_colors():
@@ -81,15 +83,31 @@ class MainApp(QApplication):
     def __init__(self, argv):
         super().__init__(argv)
         self.tts = TTSService()
+        # 预先合成唤醒回复等常用短语，唤醒时无需等待网络请求
+        self.tts.prewarm()
 
     def speak(self, text):
         """播放语音"""
         self.tts.speak(text)
+    
+    def begin_speech_stream(self):
+        """开始流式播报，返回本次播报的编号"""
+        return self.tts.begin_stream()
+    
+    def feed_speech(self, text_delta, stream=None):
+        """追加流式播报文本；stream为begin_speech_stream返回的编号，播报已被打断或替换时忽略"""
+        self.tts.feed(text_delta, stream)
+    
+    def end_speech_stream(self, fallback_text=None, stream=None):
+        """结束流式播报，未收到任何流式文本时播报fallback_text"""
+        if fallback_text:
+            self.tts.feed(fallback_text, stream)
+        self.tts.end_stream(stream)
 
 class CircleWidget(QWidget):
     hotkey_voice_signal = pyqtSignal()
     hotkey_chat_signal = pyqtSignal()
-    wake_word_signal = pyqtSignal()
+    wake_word_signal = pyqtSignal(str, str)
     show_response_signal = pyqtSignal(str)
     
     def __init__(self, assistant):
@@ -108,7 +126,7 @@ class CircleWidget(QWidget):
         # 连接热键信号
         self.hotkey_voice_signal.connect(self.toggle_voice_recognition)
         self.hotkey_chat_signal.connect(self.toggle_chat_dialog)
-        self.wake_word_signal.connect(lambda: self.start_voice_recognition(from_wake_word=True))
+        self.wake_word_signal.connect(self.on_wake_word)
         self.show_response_signal.connect(self.show_response)
         
         # 直接传递speak方法给assistant
@@ -127,7 +145,7 @@ class CircleWidget(QWidget):
         )
         
         # 启动语音唤醒检测
-        self.wake_word_detector.start(lambda: self.wake_word_signal.emit())
+        self.start_wake_word_detection()
         
     def init_ui(self):
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
@@ -191,6 +209,44 @@ class CircleWidget(QWidget):
                             self.start_voice_recognition()
             self.dragging = False
     
+    def start_wake_word_detection(self):
+        """启动语音唤醒检测（未启用时不启动）；播报期间提高检测门限，避免把播报声音当成说话"""
+        app = QApplication.instance()
+        self.wake_word_detector.start(
+            lambda phrase, action: self.wake_word_signal.emit(phrase, action),
+            playback_active=(lambda: app.tts.is_playing) if isinstance(app, MainApp) else None
+        )
+    
+    def apply_wake_word_settings(self):
+        """保存设置后重启唤醒词检测，使唤醒词、模型路径等修改立即生效；关闭语音唤醒时停止检测"""
+        self.wake_word_detector.stop()
+        self.start_wake_word_detection()
+    
+    def on_wake_word(self, phrase, action):
+        """
+        执行唤醒短语对应的动作：
+        voice 开始语音指令；chat 打开AI对话框；stop_speech 停止播报；media:<操作> 直接执行媒体控制
+        """
+        app = QApplication.instance()
+        if action == "voice":
+            # 播报期间被唤醒（打断）：立即停止播报并开始录音，不再播放唤醒回复
+            barge_in = isinstance(app, MainApp) and app.tts.is_playing
+            if barge_in:
+                app.tts.stop()
+            self.start_voice_recognition(from_wake_word=True, barge_in=barge_in)
+        elif action == "chat":
+            self.show_text_input()
+        elif action == "stop_speech":
+            if isinstance(app, MainApp):
+                app.tts.stop()
+        elif action.startswith("media:"):
+            # 常用指令不经过录音、识别和大模型，直接执行
+            media_action = action.split(":", 1)[1]
+            result = self.assistant.ai.system.media_control(media_action)
+            print(f"[唤醒词] {phrase}: {result}")
+        else:
+            print(f"[唤醒词] 未知动作: {action}")
+    
     def toggle_voice_recognition(self):
         """切换语音识别状态"""
         if self.is_listening:
@@ -198,13 +254,13 @@ class CircleWidget(QWidget):
         else:
             self.start_voice_recognition()
     
-    def start_voice_recognition(self, from_wake_word=False):
+    def start_voice_recognition(self, from_wake_word=False, barge_in=False):
         if self.is_listening:
             print("[DEBUG] 已经在录音中，跳过")
             return
         
         # 如果是唤醒词触发，先播放回复
-        if from_wake_word:
+        if from_wake_word and not barge_in:
             app = QApplication.instance()
             if isinstance(app, MainApp):
                 app.speak(config.WAKE_WORD_RESPONSE)
@@ -216,21 +272,43 @@ class CircleWidget(QWidget):
             # 暂停唤醒词检测
             self.wake_word_detector.pause()
             
-            text = self.assistant.voice_to_text()
+            app = QApplication.instance()
+            speech_enabled = isinstance(app, MainApp)
+            preroll_since = None
+            if from_wake_word:
+                if speech_enabled:
+                    # 等唤醒回复播完再录音，避免录进播报的声音
+                    app.tts.wait(timeout=10)
+                # 预录音频只保留唤醒之后（唤醒回复播完之后）的部分，不包含唤醒词和回复
+                preroll_since = time.time()
+            
+            text = self.assistant.voice_to_text(preroll_since)
             
             # 确保状态重置
             self.is_listening = False
             self.update()
             
-            # 恢复唤醒词检测
-            self.wake_word_detector.resume()
-            
             print(f"[DEBUG] 语音识别结果: '{text}'")
             
             if text and "需要安装" not in text and "录音失败" not in text and "识别失败" not in text:
                 print(f"[用户消息] {text}")
-                response = self.assistant.process_command(text)
+                
+                # 录音结束即恢复唤醒词检测，播报回复期间也能用唤醒词打断
+                self.wake_word_detector.resume()
+                
+                # 流式播报AI回复，首句完整后即开始合成；被打断后旧回复剩余的文本不再播报
+                streamed = []
+                stream = app.begin_speech_stream() if speech_enabled else None
+                
+                def on_delta(delta):
+                    streamed.append(delta)
+                    if speech_enabled:
+                        app.feed_speech(delta, stream)
+                
+                response = self.assistant.process_command(text, on_delta=on_delta)
                 print(f"[AI回复] {response}")
+                if speech_enabled:
+                    app.end_speech_stream(None if streamed else response, stream)
                 
                 # 使用自定义通知显示AI回复（5秒后自动关闭）
                 try:
@@ -242,12 +320,9 @@ class CircleWidget(QWidget):
                     subprocess.Popen([sys.executable, script_path, response, "auto_close"])
                 except Exception as e:
                     print(f"[通知错误] 显示AI回复通知失败: {e}")
-                
-                # 播报AI回复
-                app = QApplication.instance()
-                if isinstance(app, MainApp):
-                    app.speak(response)
             else:
+                # 恢复唤醒词检测
+                self.wake_word_detector.resume()
                 print(f"[DEBUG] 语音识别被跳过，text='{text}'")
         
         self.recording_thread = threading.Thread(target=record_and_process, daemon=True)
@@ -346,12 +421,23 @@ class CircleWidget(QWidget):
 
 class ChatDialog(QWidget):
     response_signal = pyqtSignal(str)
+    delta_signal = pyqtSignal(str)
     
     def __init__(self, assistant, parent=None):
         super().__init__(parent)
         self.assistant = assistant
+        self.stream_start = None  # 流式回复气泡在文档中的起始位置
+        self.stream_text = ""
+        self.oldest_message_id = None  # 已显示的最早一条历史消息ID
+        self.history_exhausted = False
         self.response_signal.connect(self.append_response)
+        self.delta_signal.connect(self.append_delta)
         self.init_ui()
+        
+        # 显示最近一页历史消息，向上滚动时继续加载
+        self.load_older_messages()
+        self.chat_display.verticalScrollBar().valueChanged.connect(self.on_scroll)
+        QTimer.singleShot(0, self.scroll_to_bottom)
     
     def init_ui(self):
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
@@ -442,7 +528,61 @@ class ChatDialog(QWidget):
         time_str = datetime.now().strftime("%H:%M")
         
         # 用户消息：右对齐，蓝色气泡
-        self.chat_display.append(f'''
+        self.chat_display.append(self._user_message_html(text, time_str))
+        
+        # 如果启用了AI对话框TTS输出，边接收边播报
+        app = QApplication.instance()
+        speech_enabled = config.TTS_CHAT_DIALOG_ENABLED and isinstance(app, MainApp)
+        
+        def process():
+            streamed = []
+            stream = app.begin_speech_stream() if speech_enabled else None
+            
+            def on_delta(delta):
+                streamed.append(delta)
+                self.delta_signal.emit(delta)
+                if speech_enabled:
+                    app.feed_speech(delta, stream)
+            
+            response = self.assistant.process_command(text, on_delta=on_delta)
+            if speech_enabled:
+                app.end_speech_stream(None if streamed else response, stream)
+            self.response_signal.emit(response)
+        
+        threading.Thread(target=process, daemon=True).start()
+    
+    def append_delta(self, delta):
+        """流式追加AI回复片段，原地刷新当前回复气泡"""
+        if self.stream_start is None:
+            self.stream_text = ""
+        self.stream_text += delta
+        self._render_ai_message(self.stream_text)
+    
+    def append_response(self, response):
+        """显示最终AI回复，替换流式过程中的临时气泡"""
+        self._render_ai_message(response)
+        self.stream_start = None
+        self.stream_text = ""
+    
+    def _render_ai_message(self, response):
+        from datetime import datetime
+        time_str = datetime.now().strftime("%H:%M")
+        
+        if self.stream_start is None:
+            self.stream_start = self.chat_display.document().characterCount() - 1
+        else:
+            # 移除上一次渲染的气泡
+            cursor = self.chat_display.textCursor()
+            cursor.setPosition(self.stream_start)
+            cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+            cursor.removeSelectedText()
+        
+        # AI消息：左对齐，灰色气泡
+        self.chat_display.append(self._ai_message_html(response, time_str))
+    
+    @staticmethod
+    def _user_message_html(text, time_str):
+        return f'''
             <div style="text-align:right; margin:15px 0;">
                 <div style="background: linear-gradient(135deg, rgba(70,130,180,220), rgba(100,149,237,220));
                             padding:12px 18px; border-radius:18px 18px 4px 18px;
@@ -455,20 +595,11 @@ class ChatDialog(QWidget):
                     {time_str}
                 </div>
             </div>
-        ''')
-        
-        def process():
-            response = self.assistant.process_command(text)
-            self.response_signal.emit(response)
-        
-        threading.Thread(target=process, daemon=True).start()
+        '''
     
-    def append_response(self, response):
-        from datetime import datetime
-        time_str = datetime.now().strftime("%H:%M")
-        
-        # AI消息：左对齐，灰色气泡
-        self.chat_display.append(f'''
+    @staticmethod
+    def _ai_message_html(response, time_str):
+        return f'''
             <div style="text-align:left; margin:15px 0;">
                 <div style="background: linear-gradient(135deg, rgba(80,80,80,200), rgba(60,60,60,200));
                             padding:12px 18px; border-radius:18px 18px 18px 4px;
@@ -481,13 +612,52 @@ class ChatDialog(QWidget):
                     AI · {time_str}
                 </div>
             </div>
-        ''')
+        '''
+    
+    def load_older_messages(self):
+        """加载更早的一页历史消息并插入到对话顶部，保持当前滚动位置"""
+        if self.history_exhausted:
+            return
+        try:
+            messages = self.assistant.ai.load_history_page(self.oldest_message_id, config.CHAT_HISTORY_PAGE_SIZE)
+        except Exception as e:
+            print(f"[对话记录] 加载历史消息失败: {e}")
+            return
+        if len(messages) < config.CHAT_HISTORY_PAGE_SIZE:
+            self.history_exhausted = True
+        if not messages:
+            return
+        self.oldest_message_id = messages[0]['id']
+        
+        document = self.chat_display.document()
+        scrollbar = self.chat_display.verticalScrollBar()
+        old_count = document.characterCount()
+        old_maximum = scrollbar.maximum()
+        old_value = scrollbar.value()
+        
+        cursor = QTextCursor(document)
+        cursor.movePosition(QTextCursor.Start)
+        for message in messages:
+            time_str = message['created_at'][11:16]
+            if message['role'] == 'user':
+                cursor.insertHtml(self._user_message_html(message['content'], time_str))
+            else:
+                cursor.insertHtml(self._ai_message_html(message['content'], time_str))
+            cursor.insertBlock()
         
-        # 如果启用了AI对话框TTS输出，播放语音
-        if config.TTS_CHAT_DIALOG_ENABLED:
-            app = QApplication.instance()
-            if isinstance(app, MainApp):
-                app.speak(response)
+        # 顶部插入内容后，修正流式气泡位置和滚动位置
+        if self.stream_start is not None:
+            self.stream_start += document.characterCount() - old_count
+        scrollbar.setValue(old_value + scrollbar.maximum() - old_maximum)
+    
+    def on_scroll(self, value):
+        """滚动到顶部时加载更早的消息"""
+        if value == self.chat_display.verticalScrollBar().minimum():
+            self.load_older_messages()
+    
+    def scroll_to_bottom(self):
+        scrollbar = self.chat_display.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
     
     def showEvent(self, event):
         """窗口显示时自动聚焦到输入框"""
@@ -1398,14 +1568,11 @@ class SettingsDialog(QDialog):
         config.MICROPHONE_DEVICE_INDEX = self.microphone_combo.currentData()
         
         try:
-            import pyaudio
             import numpy as np
+            from services.audio_capture import get_audio_capture
             
-            p = pyaudio.PyAudio()
-            device_index = config.MICROPHONE_DEVICE_INDEX
-            stream = p.open(format=pyaudio.paInt16, channels=1, rate=16000,
-                          input=True, frames_per_buffer=1024,
-                          input_device_index=device_index)
+            # 从共享的采集总线读取音频（切换测试设备时总线会自动重新打开麦克风）
+            subscription = get_audio_capture().subscribe()
             
             # 创建进度对话框
             progress = QProgressDialog("正在检测麦克风声音...\n请对着麦克风说话", "停止", 0, 30, self)
@@ -1414,20 +1581,20 @@ class SettingsDialog(QDialog):
             progress.show()
             
             volumes = []
-            for i in range(30):  # 测试3秒
-                if progress.wasCanceled():
-                    break
-                data = stream.read(1024)
-                audio_data = np.frombuffer(data, dtype=np.int16)
-                volume = np.abs(audio_data).mean()
-                volumes.append(volume)
-                progress.setValue(i)
-                QApplication.processEvents()
-                time.sleep(0.1)
-            
-            stream.stop_stream()
-            stream.close()
-            p.terminate()
+            try:
+                for i in range(30):  # 测试3秒
+                    if progress.wasCanceled():
+                        break
+                    data = subscription.read(timeout=0.1)
+                    if data is not None:
+                        audio_data = np.frombuffer(data, dtype=np.int16)
+                        volume = np.abs(audio_data).mean()
+                        volumes.append(volume)
+                    progress.setValue(i)
+                    QApplication.processEvents()
+                    time.sleep(0.1)
+            finally:
+                subscription.close()
             progress.close()
             
             if volumes:
@@ -1470,8 +1637,8 @@ class SettingsDialog(QDialog):
             
             result_text = []
             
-            def callback():
-                result_text.append(f"✓ 检测到唤醒词: {config.WAKE_WORD}")
+            def callback(phrase, action):
+                result_text.append(f"✓ 检测到唤醒短语: {phrase}")
             
             detector = WakeWordDetector()
             
@@ -1495,15 +1662,18 @@ class SettingsDialog(QDialog):
             detector.stop()
             msg.close()
             
+            model_info = f"Vosk{get_vosk_model_manager().describe()}"
             if result_text:
-                QMessageBox.information(self, "测试成功", "\n".join(result_text))
+                QMessageBox.information(self, "测试成功", "\n".join(result_text + ["", model_info]))
             else:
-                QMessageBox.information(self, "测试结果", "未检测到唤醒词\n\n请确保:\n1. 麦克风工作正常\n2. 说话声音足够大\n3. 唤醒词发音清晰")
+                QMessageBox.information(self, "测试结果", f"未检测到唤醒词\n\n请确保:\n1. 麦克风工作正常\n2. 说话声音足够大\n3. 唤醒词发音清晰\n\n{model_info}")
         
         except Exception as e:
             QMessageBox.warning(self, "测试失败", f"唤醒词测试失败: {str(e)}")
         finally:
             config.MICROPHONE_DEVICE_INDEX = old_device
+            # 未启用语音唤醒时，测试加载的模型用完即释放
+            get_vosk_model_manager().release_if_unused()
     
     def test_voice_api(self):
         """测试语音识别API"""
@@ -1753,9 +1923,39 @@ WEATHER_API_URL = "{config.WEATHER_API_URL}"
 # PushPlus通知配置
 PUSHPLUS_TOKEN = os.getenv("PUSHPLUS_TOKEN", "{config.PUSHPLUS_TOKEN}")
 
+# HTTP连接配置（所有对外请求共享连接池）
+HTTP_CONNECT_TIMEOUT = {config.HTTP_CONNECT_TIMEOUT}  # 连接超时（秒）
+HTTP_READ_TIMEOUT = {config.HTTP_READ_TIMEOUT}  # 读取超时（秒）
+HTTP_RETRY_TOTAL = {config.HTTP_RETRY_TOTAL}  # 失败重试次数
+HTTP_RETRY_BACKOFF = {config.HTTP_RETRY_BACKOFF}  # 重试退避系数（秒）
+HTTP_POOL_CONNECTIONS = {config.HTTP_POOL_CONNECTIONS}  # 连接池数量（按主机）
+HTTP_POOL_MAXSIZE = {config.HTTP_POOL_MAXSIZE}  # 每个主机的最大连接数
+
+# 工具调用配置
+TOOL_MAX_WORKERS = {config.TOOL_MAX_WORKERS}  # 同一轮工具调用的最大并发数
+TOOL_TIMEOUT = {config.TOOL_TIMEOUT}  # 并发工具的默认超时（秒）
+TOOL_TIMEOUTS = {config.TOOL_TIMEOUTS!r}  # 各并发工具的超时（秒），不短于工具内HTTP请求的超时
+INTENT_FAST_PATH_ENABLED = {config.INTENT_FAST_PATH_ENABLED}  # 简单指令是否绕过大模型本地执行
+
+# 对话上下文配置
+CONTEXT_TOKEN_BUDGET = {config.CONTEXT_TOKEN_BUDGET}  # 发送给模型的上下文token上限
+CONTEXT_KEEP_TURNS = {config.CONTEXT_KEEP_TURNS}  # 保留完整工具结果的最近对话轮数
+
 # 日程数据库文件
 SCHEDULE_DB = "schedules.db"
 
+# 对话记录配置
+CONVERSATION_DB = "{config.CONVERSATION_DB}"  # 对话记录数据库文件
+CONVERSATION_RESTORE_COUNT = {config.CONVERSATION_RESTORE_COUNT}  # 启动后恢复到上下文的最近消息条数
+CHAT_HISTORY_PAGE_SIZE = {config.CHAT_HISTORY_PAGE_SIZE}  # AI对话框每次加载的历史消息条数
+
+# 回复缓存配置
+RESPONSE_CACHE_ENABLED = {config.RESPONSE_CACHE_ENABLED}  # 是否缓存大模型回复
+RESPONSE_CACHE_DB = "{config.RESPONSE_CACHE_DB}"  # 回复缓存数据库文件
+RESPONSE_CACHE_MAX_ENTRIES = {config.RESPONSE_CACHE_MAX_ENTRIES}  # 最多缓存条数（LRU淘汰）
+RESPONSE_CACHE_TTL = {config.RESPONSE_CACHE_TTL}  # 默认有效期（秒）
+REMIND_POLISH_CACHE_TTL = {config.REMIND_POLISH_CACHE_TTL}  # 提醒润色结果有效期（秒）
+
 # 日程窗口透明度 (0-100, 0为完全透明, 100为完全不透明)
 SCHEDULE_WINDOW_OPACITY = {config.SCHEDULE_WINDOW_OPACITY}
 
@@ -1783,11 +1983,24 @@ HOTKEY_CHAT = "{config.HOTKEY_CHAT}"   # AI对话框热键
 WAKE_WORD = "{config.WAKE_WORD}"  # 唤醒词
 WAKE_WORD_ENABLED = {config.WAKE_WORD_ENABLED}  # 是否启用语音唤醒
 WAKE_WORD_RESPONSE = "{config.WAKE_WORD_RESPONSE}"  # 唤醒词回复语句
+WAKE_WORD_MODE = "{config.WAKE_WORD_MODE}"  # 唤醒词识别方式: keyword 只识别唤醒词的受限语法，说出即触发、占用CPU少 / open 开放词表识别，停顿后匹配
+WAKE_GATE_ENABLED = {config.WAKE_GATE_ENABLED}  # 安静时不运行唤醒词识别，检测到声音才开始解码，空闲时几乎不占CPU
+WAKE_WORD_ACTIONS = {config.WAKE_WORD_ACTIONS!r}  # 其他唤醒短语及动作: chat 打开对话框 / stop_speech 停止播报 / media:<播放|暂停|下一首|上一首|音量增大|音量减小>
+WAKE_BARGE_IN = {config.WAKE_BARGE_IN}  # 播报回复时保持唤醒词检测，说出唤醒词可打断播报并立即开始录音
+WAKE_BARGE_IN_RATIO = {config.WAKE_BARGE_IN_RATIO}  # 播报期间麦克风音量超过回声音量多少倍才视为有人说话，扬声器离麦克风较近时调大
 VOSK_MODEL_PATH = "{config.VOSK_MODEL_PATH}"  # Vosk模型路径
 
 # 麦克风设备配置
 MICROPHONE_DEVICE_INDEX = {config.MICROPHONE_DEVICE_INDEX}  # None表示使用默认麦克风，否则为设备索引
 SILENCE_DURATION = {config.SILENCE_DURATION}  # 静音多少秒后自动停止录音
+AUDIO_BUFFER_SECONDS = {config.AUDIO_BUFFER_SECONDS}  # 麦克风采集环形缓冲保留的秒数
+RECORD_PREROLL_SECONDS = {config.RECORD_PREROLL_SECONDS}  # 录音开始时带上之前多少秒的音频，避免漏掉开口的第一个字
+VAD_ENGINE = "{config.VAD_ENGINE}"  # 语音检测方式: energy 能量+过零率 / webrtc（需安装webrtcvad）
+VAD_MIN_SILENCE = {config.VAD_MIN_SILENCE}  # 一口气说完的短指令静音多少秒即结束录音，说话停顿较长时自动延长，最多SILENCE_DURATION
+VOICE_STREAMING_ENABLED = {config.VOICE_STREAMING_ENABLED}  # 流式识别：说话停顿时即在后台开始识别，结束录音时结果已就绪
+VOICE_STREAMING_PAUSE = {config.VOICE_STREAMING_PAUSE}  # 停顿多少秒后开始提前识别
+ASR_POLICY = "{config.ASR_POLICY}"  # 语音识别方式: online 在线 / local 本地Vosk（离线可用） / local_first 本地优先，置信度低时在线识别
+ASR_LOCAL_MIN_CONFIDENCE = {config.ASR_LOCAL_MIN_CONFIDENCE}  # local_first模式下本地识别结果的最低平均置信度
 
 # 系统设置
 AUTOSTART_ENABLED = False  # 开机自启（此配置仅用于显示，实际状态从注册表读取)
@@ -1799,6 +2012,14 @@ TTS_VOICE = "{config.TTS_VOICE}"  # 音色
 TTS_SPEED = {config.TTS_SPEED}  # 语速 (0.25-2.0)
 TTS_PITCH = {config.TTS_PITCH}  # 音调
 TTS_STREAM = {config.TTS_STREAM}  # 是否使用流式响应
+TTS_RESPONSE_FORMAT = "{config.TTS_RESPONSE_FORMAT}"  # 音频格式 (mp3/pcm)，流式响应且为pcm时边下载边播放
+TTS_PCM_SAMPLE_RATE = {config.TTS_PCM_SAMPLE_RATE}  # pcm格式的采样率
+TTS_PREFETCH_COUNT = {config.TTS_PREFETCH_COUNT}  # 播放当前句时最多预先合成的句数
+TTS_CACHE_ENABLED = {config.TTS_CACHE_ENABLED}  # 是否缓存合成的语音
+TTS_CACHE_DIR = "{config.TTS_CACHE_DIR}"  # 语音缓存目录
+TTS_CACHE_MAX_MB = {config.TTS_CACHE_MAX_MB}  # 语音缓存占用磁盘上限（MB），超出时删除最久未使用的
+TTS_CACHE_MEMORY_ENTRIES = {config.TTS_CACHE_MEMORY_ENTRIES}  # 内存中保留的最近使用语音条数
+TTS_PREWARM_PHRASES = {config.TTS_PREWARM_PHRASES!r}  # 启动时预先合成的常用短语（唤醒回复总会预合成）
 TTS_REMOVE_MARKDOWN = {config.TTS_REMOVE_MARKDOWN}  # 移除Markdown
 TTS_REMOVE_EMOJI = {config.TTS_REMOVE_EMOJI}  # 移除Emoji
 TTS_REMOVE_URL = {config.TTS_REMOVE_URL}  # 移除URL
@@ -1824,6 +2045,14 @@ REMINDER_REPEAT_INTERVAL = {config.REMINDER_REPEAT_INTERVAL}  # 重复提醒间
             elif isinstance(widget, CircleWidget):
                 widget.setWindowOpacity(config.GLOBAL_WINDOW_OPACITY / 100.0)
                 widget.update()
+                widget.apply_wake_word_settings()
+        
+        # 语音唤醒和本地识别都未启用时释放Vosk模型的内存，否则按新的模型路径在后台（重新）加载
+        model_manager = get_vosk_model_manager()
+        if config.WAKE_WORD_ENABLED or config.ASR_POLICY != "online":
+            model_manager.load_async(retry=True)
+        else:
+            model_manager.unload()
         
         # 应用设置窗口透明度
         self.setWindowOpacity(config.SETTINGS_WINDOW_OPACITY / 100.0)
@@ -1839,7 +2068,7 @@ REMINDER_REPEAT_INTERVAL = {config.REMINDER_REPEAT_INTERVAL}  # 重复提醒间
         msg.setIcon(QMessageBox.Information)
         msg.setWindowTitle("保存成功")
         msg.setText("设置已保存成功！")
-        msg.setInformativeText("热键和语音唤醒设置需要重启应用后生效。")
+        msg.setInformativeText("热键设置需要重启应用后生效。")
         msg.setStandardButtons(QMessageBox.Ok)
         msg.exec_()
 
@@ -2175,17 +2404,13 @@ class ScheduleWindow(QWidget):
             month = current_date.month()
             
             # 获取当月所有日程
-            conn = __import__('sqlite3').connect(self.assistant.ai.schedule.db_path)
-            cursor = conn.cursor()
             start_date = f"{year}-{month:02d}-01"
             if month == 12:
                 end_date = f"{year+1}-01-01"
             else:
                 end_date = f"{year}-{month+1:02d}-01"
             
-            cursor.execute('SELECT DISTINCT DATE(datetime) FROM schedules WHERE datetime >= ? AND datetime < ?', (start_date, end_date))
-            schedule_dates = [row[0] for row in cursor.fetchall()]
-            conn.close()
+            schedule_dates = self.assistant.ai.schedule.get_schedule_dates(start_date, end_date)
             
             # 设置有日程的日期格式
             for date_str in schedule_dates:
@@ -2220,13 +2445,7 @@ class ScheduleWindow(QWidget):
                     self.schedule_list.addItem(f"⏰ {datetime_str}\n   {task} {repeat_icon}")
         elif self.show_history:
             # 显示所有历史日程（已过期的）
-            from datetime import datetime
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            conn = __import__('sqlite3').connect(self.assistant.ai.schedule.db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT datetime, task FROM schedules WHERE datetime < ? ORDER BY datetime DESC LIMIT 20', (now,))
-            schedules = [{"datetime": row[0], "task": row[1]} for row in cursor.fetchall()]
-            conn.close()
+            schedules = self.assistant.ai.schedule.load_history(limit=20)
             
             if not schedules:
                 self.schedule_list.addItem("📝 暂无历史日程")
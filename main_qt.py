@@ -6,6 +6,7 @@ from services.voice_recognition import VoiceRecognition
 from core.ai_core_with_tools import AIWithTools
 from gui.gui_qt import run_gui
 from services.admin_manager import AdminManager
+import config
 
 class AIAssistant:
     def __init__(self):
@@ -13,14 +14,16 @@ class AIAssistant:
         self.ai = AIWithTools()
         self.ai.schedule.start()
     
-    def voice_to_text(self):
-        result = self.voice.record_audio(5)
+    def voice_to_text(self, preroll_since=None):
+        if config.VOICE_STREAMING_ENABLED or config.ASR_POLICY != "online":
+            return self.voice.recognize(5, preroll_since)
+        result = self.voice.record_audio(5, preroll_since)
         if isinstance(result, str) and ("需要安装" in result or "录音失败" in result):
             return result
         return self.voice.transcribe(result)
     
-    def process_command(self, command):
-        return self.ai.chat(command)
+    def process_command(self, command, on_delta=None):
+        return self.ai.chat(command, on_delta=on_delta)
 
     def set_speak_callback(self, callback):
         self.ai.set_speak_callback(callback)
@@ -0,0 +1,221 @@
+import threading
+import queue
+import time
+from collections import deque
+import numpy as np
+import config
+
+try:
+    import pyaudio
+    PYAUDIO_AVAILABLE = True
+except ImportError:
+    PYAUDIO_AVAILABLE = False
+
+RATE = 16000
+BLOCK_SIZE = 1024  # 每块采样数（16位单声道，约64毫秒）
+NOISE_WINDOW_SECONDS = 10.0  # 估计环境噪音时参考最近多少秒的音量
+NOISE_PERCENTILE = 20  # 取音量的低分位数作为噪音基线，说话时也不会被明显抬高
+
+class AudioSubscription:
+    """采集总线的一个订阅者，按顺序读取音频块；处理不及时时丢弃最旧的块"""
+    def __init__(self, bus, max_blocks):
+        self.bus = bus
+        self.queue = queue.Queue(maxsize=max_blocks)
+
+    def put(self, block):
+        while True:
+            try:
+                self.queue.put_nowait(block)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def read(self, timeout=None):
+        """读取下一块音频（bytes），超时返回None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class AudioCapture:
+    """
+    音频采集总线：整个进程只打开一个麦克风输入流，后台线程持续读取，
+    保留最近几秒的环形缓冲，并把每块音频分发给所有订阅者（唤醒词检测、录音、麦克风测试）；
+    同时持续估计环境噪音基线，录音开始时无需再单独校准
+    有订阅者时保持设备打开，最后一个订阅者退出后关闭设备
+    """
+    def __init__(self, buffer_seconds=3.0):
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.ring = deque(maxlen=max(1, int(buffer_seconds * RATE / BLOCK_SIZE)))  # (采集时间, 音频块)
+        self.volumes = deque(maxlen=int(NOISE_WINDOW_SECONDS * RATE / BLOCK_SIZE))  # 最近每块的平均音量
+        self.thread = None
+        self.device_index = None  # 实际打开的设备
+        self.requested_device = None  # 打开设备时的MICROPHONE_DEVICE_INDEX设置
+
+    def subscribe(self, preroll=0.0, since=None, max_seconds=10.0):
+        """
+        订阅音频块
+        :param preroll: 先送入环形缓冲中最近多少秒的音频（订阅之前已采集的部分）
+        :param since: 预录音频只取该时间（time.time()）之后采集的部分，如唤醒回复播完的时间
+        :param max_seconds: 订阅者最多积压多少秒的音频
+        """
+        if not PYAUDIO_AVAILABLE:
+            raise RuntimeError("音频采集需要安装pyaudio库")
+        subscription = AudioSubscription(self, max(1, int(max_seconds * RATE / BLOCK_SIZE)))
+        with self.lock:
+            if preroll > 0:
+                count = int(preroll * RATE / BLOCK_SIZE)
+                for captured_at, block in list(self.ring)[-count:]:
+                    if since is None or captured_at >= since:
+                        subscription.put(block)
+            self.subscribers.append(subscription)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+
+    def _capture_loop(self):
+        audio_interface = pyaudio.PyAudio()
+        stream = None
+        try:
+            while True:
+                with self.lock:
+                    if not self.subscribers:
+                        # 在锁内决定退出，保证之后的订阅会启动新的采集线程
+                        self.thread = None
+                        self.ring.clear()
+                        self.volumes.clear()
+                        break
+
+                # 设置中切换了麦克风（包括设置页的临时测试）时重新打开设备
+                if stream is not None and config.MICROPHONE_DEVICE_INDEX != self.requested_device:
+                    print("[音频采集] 麦克风设置已变更，重新打开设备")
+                    stream = self._close_stream(stream)
+
+                if stream is None:
+                    stream = self._open_stream(audio_interface)
+                    if stream is None:
+                        print("[音频采集] 2秒后重试...")
+                        time.sleep(2)
+                        continue
+
+                try:
+                    data = stream.read(BLOCK_SIZE, exception_on_overflow=False)
+                except Exception as e:
+                    print(f"[音频采集] 读取音频出错，重新打开设备: {e}")
+                    stream = self._close_stream(stream)
+                    time.sleep(0.1)
+                    continue
+
+                volume = np.abs(np.frombuffer(data, dtype=np.int16)).mean()
+                with self.lock:
+                    self.ring.append((time.time(), data))
+                    self.volumes.append(volume)
+                    subscribers = list(self.subscribers)
+                for subscription in subscribers:
+                    subscription.put(data)
+        finally:
+            self._close_stream(stream)
+            try:
+                audio_interface.terminate()
+            except Exception:
+                pass
+            print("[音频采集] 麦克风已关闭")
+
+    def noise_floor(self):
+        """
+        当前环境噪音基线（每块平均音量的低分位数）
+        设备刚打开、采集不足0.5秒时返回None
+        """
+        with self.lock:
+            if len(self.volumes) < int(0.5 * RATE / BLOCK_SIZE):
+                return None
+            volumes = list(self.volumes)
+        return float(np.percentile(volumes, NOISE_PERCENTILE))
+
+    def _close_stream(self, stream):
+        if stream is not None:
+            try:
+                stream.stop_stream()
+                stream.close()
+            except Exception:
+                pass
+        return None
+
+    def _open_stream(self, audio_interface):
+        """按MICROPHONE_DEVICE_INDEX打开输入设备，失败时依次尝试其他输入设备"""
+        requested = config.MICROPHONE_DEVICE_INDEX
+        input_devices = []
+        for i in range(audio_interface.get_device_count()):
+            device_info = audio_interface.get_device_info_by_index(i)
+            if device_info['maxInputChannels'] > 0:
+                input_devices.append((i, device_info))
+
+        if not input_devices:
+            print("[音频采集错误] 未找到任何音频输入设备")
+            print("[音频采集] 请检查:")
+            print("  1. 麦克风是否已连接")
+            print("  2. 麦克风驱动是否已安装")
+            print("  3. 麦克风权限是否已授予")
+            return None
+
+        candidates = [index for index, _ in input_devices]
+        if requested is not None:
+            if requested in candidates:
+                candidates.remove(requested)
+                candidates.insert(0, requested)
+            else:
+                print(f"[音频采集错误] 设备 {requested} 不是可用的输入设备，使用其他设备")
+
+        for index in candidates:
+            try:
+                stream = audio_interface.open(
+                    format=pyaudio.paInt16,
+                    channels=1,
+                    rate=RATE,
+                    input=True,
+                    frames_per_buffer=BLOCK_SIZE,
+                    input_device_index=index
+                )
+            except Exception as e:
+                print(f"[音频采集] 设备 {index} 打开失败: {e}")
+                continue
+            name = audio_interface.get_device_info_by_index(index)['name']
+            print(f"[音频采集] 麦克风已打开，使用设备: {index} - {name}")
+            self.device_index = index
+            self.requested_device = requested
+            return stream
+
+        print("[音频采集错误] 所有音频设备都无法打开")
+        return None
+
+
+_capture = None
+_capture_lock = threading.Lock()
+
+def get_audio_capture():
+    """获取进程内共享的AudioCapture实例"""
+    global _capture
+    if _capture is None:
+        with _capture_lock:
+            if _capture is None:
+                _capture = AudioCapture(config.AUDIO_BUFFER_SECONDS)
+    return _capture
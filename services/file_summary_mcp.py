@@ -1,6 +1,8 @@
-import requests
+from services.http_client import get_http_client
 import config
+import os
 from services.file_handler import FileHandler
+from services.response_cache import get_response_cache
 
 class FileSummaryMCP:
     def __init__(self):
@@ -9,6 +11,16 @@ class FileSummaryMCP:
     def generate_summary(self, filepath):
         """生成文件内容摘要"""
         try:
+            # 同一文件未修改时直接返回缓存的摘要
+            cache = get_response_cache()
+            cache_key = None
+            if cache and os.path.exists(filepath):
+                stat = os.stat(filepath)
+                cache_key = cache.make_key("file_summary", os.path.abspath(filepath), config.AI_MODEL, [stat.st_mtime, stat.st_size])
+                cached_summary = cache.get(cache_key)
+                if cached_summary:
+                    return cached_summary
+            
             content = self.file_handler.read_file(filepath)
             if "不支持" in content or "失败" in content:
                 return content
@@ -27,9 +39,12 @@ class FileSummaryMCP:
                 "max_tokens": 500
             }
             
-            response = requests.post(url, headers=headers, json=data)
+            response = get_http_client().post(url, headers=headers, json=data)
             result = response.json()
             summary = result['choices'][0]['message']['content']
-            return f"文件摘要：\n{summary}"
+            summary_text = f"文件摘要：\n{summary}"
+            if cache_key:
+                cache.set(cache_key, summary_text)
+            return summary_text
         except Exception as e:
             return f"生成摘要失败: {str(e)}"
\ No newline at end of file
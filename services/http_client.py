@@ -0,0 +1,85 @@
+import threading
+import time
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import config
+
+class HttpClient:
+    """
+    共享的HTTP客户端，所有对外请求（SiliconFlow、TTS、天气、PushPlus等）都经过这里，
+    复用同一组按主机划分的keep-alive连接池，避免每次请求重新握手TCP+TLS
+    """
+    def __init__(self):
+        self.session = self._create_session()
+        self.local = threading.local()  # 当前线程的请求截止时间
+
+    def _create_session(self):
+        session = requests.Session()
+        # 连接错误对所有方法重试；状态码重试只针对幂等方法，避免重复提交POST
+        retry = Retry(
+            total=config.HTTP_RETRY_TOTAL,
+            connect=config.HTTP_RETRY_TOTAL,
+            backoff_factor=config.HTTP_RETRY_BACKOFF,
+            status_forcelist=[429, 500, 502, 503, 504],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=config.HTTP_POOL_CONNECTIONS,
+            pool_maxsize=config.HTTP_POOL_MAXSIZE,
+            max_retries=retry
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @contextmanager
+    def deadline(self, deadline):
+        """
+        在with块内为当前线程发出的请求设置截止时刻（time.monotonic()的值）
+        每个请求的超时不超过剩余时间，到期后不再发出新请求，超时的工具调用随之结束，不会一直占用工作线程
+        """
+        previous = getattr(self.local, "deadline", None)
+        self.local.deadline = deadline if previous is None else min(previous, deadline)
+        try:
+            yield
+        finally:
+            self.local.deadline = previous
+
+    def request(self, method, url, **kwargs):
+        """发送请求，未指定timeout时使用配置中的默认(连接, 读取)超时；设置了截止时刻时超时不超过剩余时间"""
+        kwargs.setdefault("timeout", (config.HTTP_CONNECT_TIMEOUT, config.HTTP_READ_TIMEOUT))
+        deadline = getattr(self.local, "deadline", None)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.Timeout(f"已超过时限，未发送请求: {url}")
+            timeout = kwargs["timeout"]
+            if isinstance(timeout, tuple):
+                kwargs["timeout"] = tuple(remaining if value is None else min(value, remaining) for value in timeout)
+            else:
+                kwargs["timeout"] = remaining if timeout is None else min(timeout, remaining)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_http_client():
+    """获取进程内共享的HttpClient实例"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
@@ -0,0 +1,55 @@
+import json
+from services.vosk_model import get_vosk_model, VOSK_AVAILABLE
+
+if VOSK_AVAILABLE:
+    from vosk import KaldiRecognizer
+
+class LocalASR:
+    """
+    本地语音识别（Vosk）：与唤醒词检测共享已加载的模型，使用独立的识别器，
+    录音时逐块送入音频，结束时即可得到结果和平均置信度，无需联网
+    """
+    def __init__(self, rate=16000):
+        self.rate = rate
+        self.recognizer = None
+        self.segments = []  # 已结束的语句 [(文本, 各词置信度)]
+
+    def start(self, timeout=None):
+        """
+        创建识别器，模型不可用时返回False
+        :param timeout: 模型正在加载时最多等待多少秒，None表示等到加载结束
+        """
+        model = get_vosk_model(timeout)
+        if model is None:
+            return False
+        self.recognizer = KaldiRecognizer(model, self.rate)
+        self.recognizer.SetWords(True)
+        self.segments = []
+        return True
+
+    def _collect(self, result_json):
+        result = json.loads(result_json)
+        text = result.get("text", "")
+        if text:
+            self.segments.append((text, [word.get("conf", 0.0) for word in result.get("result", [])]))
+
+    def accept(self, data):
+        """送入一块16位单声道PCM"""
+        if self.recognizer.AcceptWaveform(data):
+            self._collect(self.recognizer.Result())
+
+    def partial(self):
+        """当前未结束语句的中间结果"""
+        return json.loads(self.recognizer.PartialResult()).get("partial", "").replace(" ", "")
+
+    def finish(self):
+        """
+        结束识别
+        :return: (文本, 平均置信度)，没有识别到内容时置信度为0
+        """
+        self._collect(self.recognizer.FinalResult())
+        # 中文模型的输出按词以空格分隔，合并为连续文本
+        text = "".join(text.replace(" ", "") for text, _ in self.segments)
+        confidences = [conf for _, confs in self.segments for conf in confs]
+        confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return text, confidence
@@ -1,4 +1,4 @@
-import requests
+from services.http_client import get_http_client
 import json
 import config
 
@@ -19,7 +19,7 @@ class LocationService:
             }
             
             # 使用B站API获取位置
-            response = requests.get(self.bilibili_api_url, headers=headers, timeout=5)
+            response = get_http_client().get(self.bilibili_api_url, headers=headers, timeout=5)
             response.encoding = 'utf-8'
             
             print(f"[Location Debug] 状态码: {response.status_code}")
@@ -52,7 +52,7 @@ class LocationService:
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
                 'Referer': 'https://www.bilibili.com/'
             }
-            response = requests.get(self.bilibili_api_url, headers=headers, timeout=5)
+            response = get_http_client().get(self.bilibili_api_url, headers=headers, timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 if data.get('code') == 0:
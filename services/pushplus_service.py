@@ -1,4 +1,4 @@
-import requests
+from services.http_client import get_http_client
 import json
 import config
 from datetime import datetime
@@ -26,7 +26,7 @@ class PushPlusService:
                 "Content-Type": "application/json"
             }
             
-            response = requests.post(self.base_url, data=json.dumps(data), headers=headers, timeout=10)
+            response = get_http_client().post(self.base_url, data=json.dumps(data), headers=headers, timeout=10)
             result = response.json()
             
             if result.get("code") == 200:
@@ -0,0 +1,135 @@
+import sqlite3
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+import config
+
+# 归一化时去掉的时间前缀、标点和空白，使措辞略有差异的相同问题命中同一条缓存
+# 数字之间的小数点和千分位逗号保留，避免"3.5"和"35"得到相同的键
+TIME_PREFIX_PATTERN = re.compile(r'^\[当前时间: [^\]]*\]\s*')
+NOISE_PATTERN = re.compile(r'[\s，。！？、!?~～"“”\'‘’]+|(?<!\d)[,.]|[,.](?!\d)')
+
+def normalize_prompt(text):
+    text = TIME_PREFIX_PATTERN.sub('', text or '')
+    return NOISE_PATTERN.sub('', text).lower()
+
+class ResponseCache:
+    """
+    大模型回复缓存：内存LRU在前，SQLite持久化在后，每条记录有独立的过期时间
+    键由命名空间、模型、归一化后的提示词和相关状态共同决定
+    """
+    def __init__(self, db_path, max_entries=500, default_ttl=86400):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.memory = OrderedDict()  # key -> (value, expires_at)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        # 启动时清理过期记录
+        self.conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (time.time(),))
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(namespace, prompt, model=None, state=None):
+        """生成缓存键，state为影响回复的额外状态（如文件修改时间、日程版本）"""
+        raw = json.dumps([namespace, model, normalize_prompt(prompt), state], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """读取缓存，未命中或已过期返回None"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is None:
+                row = self.conn.execute("SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)).fetchone()
+                if row:
+                    entry = (row[0], row[1])
+                    self._remember(key, entry)
+            if entry is None or entry[1] < now:
+                if entry is not None:
+                    self._forget(key)
+                self.misses += 1
+                return None
+
+            self.memory.move_to_end(key)
+            self.conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """写入缓存，ttl为秒数，默认使用default_ttl"""
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.default_ttl)
+        with self.lock:
+            self._remember(key, (value, expires_at))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now)
+            )
+            # 磁盘上同样只保留最近使用的max_entries条
+            self.conn.execute(
+                "DELETE FROM response_cache WHERE key NOT IN (SELECT key FROM response_cache ORDER BY last_access DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self.conn.commit()
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _forget(self, key):
+        self.memory.pop(key, None)
+        self.conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+        self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.conn.execute("DELETE FROM response_cache")
+            self.conn.commit()
+
+    def stats(self):
+        """命中统计"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self.memory)
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """获取进程内共享的ResponseCache实例，未启用缓存时返回None"""
+    global _cache
+    if not config.RESPONSE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    config.RESPONSE_CACHE_DB,
+                    max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+                    default_ttl=config.RESPONSE_CACHE_TTL
+                )
+    return _cache
@@ -0,0 +1,166 @@
+import os
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+import config
+
+class TTSAudioCache:
+    """
+    合成语音缓存：以文本和音色参数的哈希为文件名保存在磁盘上，
+    内存中保留最近使用的少量音频，磁盘总大小超出上限时删除最久未使用的文件
+    """
+    def __init__(self, cache_dir, max_bytes, memory_entries=50):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict()  # key -> 音频数据
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = 0
+        for entry in os.scandir(cache_dir):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith('.audio'):
+                self.total_bytes += entry.stat().st_size
+            elif entry.name.endswith('.tmp'):
+                # 上次写入中途退出留下的临时文件
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def make_key(text, voice, speed, pitch, response_format):
+        """生成缓存键，任一合成参数变化都会得到不同的键"""
+        raw = json.dumps([text, voice, speed, pitch, response_format], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.audio")
+
+    def get(self, key):
+        """读取缓存的音频数据，未命中返回None"""
+        with self.lock:
+            path = self._path(key)
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                # 内存命中同样刷新修改时间，否则最常用的短语在磁盘上看起来最久未使用，最先被淘汰
+                try:
+                    os.utime(path, None)
+                except OSError:
+                    pass
+                return data
+
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                # 用修改时间记录最近使用，淘汰时据此排序
+                os.utime(path, None)
+            except OSError:
+                self.misses += 1
+                return None
+
+            self._remember(key, data)
+            self.hits += 1
+            return data
+
+    def contains(self, key):
+        with self.lock:
+            return key in self.memory or os.path.exists(self._path(key))
+
+    def set(self, key, data):
+        """写入音频数据，先写临时文件再改名，避免读到写了一半的文件"""
+        if not data:
+            return
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self.lock:
+            self._remember(key, data)
+            try:
+                old_size = os.path.getsize(path) if os.path.exists(path) else 0
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+                self.total_bytes += len(data) - old_size
+            except OSError as e:
+                print(f"[TTS缓存] 写入失败: {e}")
+                # 临时文件不计入总大小，也不会被淘汰，写入失败时直接删除
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                return
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _remember(self, key, data):
+        self.memory[key] = data
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict(self):
+        """删除最久未使用的文件，直到总大小降到上限的90%"""
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.is_file() and entry.name.endswith('.audio')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for entry in entries:
+            if self.total_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+            self.memory.pop(entry.name[:-len('.audio')], None)
+            removed += 1
+        print(f"[TTS缓存] 淘汰 {removed} 个文件，当前 {self.total_bytes // 1024} KB")
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file():
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+            self.total_bytes = 0
+
+    def stats(self):
+        """命中统计"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self.memory),
+                "disk_bytes": self.total_bytes
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_tts_audio_cache():
+    """获取进程内共享的TTSAudioCache实例，未启用缓存时返回None"""
+    global _cache
+    if not config.TTS_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTSAudioCache(
+                    config.TTS_CACHE_DIR,
+                    max_bytes=config.TTS_CACHE_MAX_MB * 1024 * 1024,
+                    memory_entries=config.TTS_CACHE_MEMORY_ENTRIES
+                )
+    return _cache
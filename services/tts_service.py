@@ -1,10 +1,19 @@
-import requests
-import tempfile
-import os
+from services.http_client import get_http_client
+from services.tts_audio_cache import TTSAudioCache, get_tts_audio_cache
+from services.tts_text_cleaner import clean_text
+import io
+import numpy as np
 from pygame import mixer
 import threading
 import config
 import re
+import queue
+
+# 按句切分播报：代码块（含尚未闭合的）和URL整体跳过，其中的换行和?!不算句末；只有最后一个分组是句末标点
+# 英文句号后面须跟空白才算句末，小数、域名不会被切开，流式文本末尾的句号等后续文本到达再判断
+SENTENCE_SPLIT_PATTERN = re.compile(r'```[\s\S]*?(?:```|\Z)|https?://\S+|www\.\S+|((?:[。！？；!?;\n]|\.(?=\s))+)')
+# 播放中检查播放状态的间隔（秒）
+PLAYBACK_POLL_INTERVAL = 0.05
 
 class TTSService:
     def __init__(self):
@@ -13,6 +22,16 @@ class TTSService:
         self.is_speaking = False
         self.current_thread = None
         self.mixer_initialized = False
+        self.stream_queue = None  # 流式播报的句子队列
+        self.stream_buffer = ""  # 尚未凑成完整句子的流式文本
+        self.stream_generation = 0  # 每次打断递增，用于丢弃过期的流式句子
+        self.playback_lock = threading.Lock()
+        self.cancel_event = threading.Event()  # 打断当前播报时置位，唤醒正在等待的播放
+        self.finished_event = threading.Event()  # 没有播报进行时置位
+        self.finished_event.set()
+        self.finished_lock = threading.Lock()
+        self.finished_callbacks = []
+        self.sound_decode_failed = False  # 当前格式无法解码为Sound时改用mixer.music播放
         self._init_mixer()
     
     def _init_mixer(self):
@@ -33,130 +52,371 @@ class TTSService:
                 print(f"[TTS] pygame mixer 备用初始化也失败: {e2}")
     
     def clean_text(self, text):
-        """清理文本"""
-        if config.TTS_REMOVE_MARKDOWN:
-            text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)
-            text = re.sub(r'\*(.+?)\*', r'\1', text)
-            text = re.sub(r'__(.+?)__', r'\1', text)
-            text = re.sub(r'_(.+?)_', r'\1', text)
-            text = re.sub(r'~~(.+?)~~', r'\1', text)
-            text = re.sub(r'`(.+?)`', r'\1', text)
-            text = re.sub(r'```[\s\S]*?```', '', text)
-            text = re.sub(r'^#+\s+', '', text, flags=re.MULTILINE)
-            text = re.sub(r'^\s*[-*+]\s+', '', text, flags=re.MULTILINE)
-            text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
+        """清理文本（按TTS_REMOVE_*设置去除Markdown、Emoji、URL等）"""
+        return clean_text(text)
+    
+    @property
+    def is_playing(self):
+        """是否有播报正在进行（包括正在合成尚未出声的句子）"""
+        return not self.finished_event.is_set()
+    
+    def wait(self, timeout=None):
+        """
+        阻塞直到当前播报结束或被打断
+        :return: 超时返回False，否则返回True
+        """
+        return self.finished_event.wait(timeout)
+    
+    def on_finished(self, callback):
+        """注册播报结束（含被打断）时的回调，回调在播放线程中无参数调用"""
+        self.finished_callbacks.append(callback)
+    
+    def _notify_finished(self, generation=None):
+        """标记播报结束并调用回调；generation不是当前播报时忽略"""
+        with self.finished_lock:
+            if generation is not None and generation != self.stream_generation:
+                return
+            if self.finished_event.is_set():
+                return
+            self.finished_event.set()
+        for callback in list(self.finished_callbacks):
+            try:
+                callback()
+            except Exception as e:
+                print(f"[TTS] 播放结束回调出错: {e}")
+    
+    def _wait_while(self, busy, cancel_event):
+        """播放期间按固定间隔检查状态，所属播报被打断时立即返回，不占用CPU"""
+        while busy() and not cancel_event.is_set():
+            cancel_event.wait(PLAYBACK_POLL_INTERVAL)
+    
+    def stop(self):
+        """停止当前播放"""
+        self._cancel()
+        self._notify_finished()
+    
+    def _cancel(self):
+        """打断当前播报，不触发结束回调"""
+        # 丢弃尚未播放的流式句子
+        self.stream_generation += 1
+        self.cancel_event.set()
+        self.stream_buffer = ""
+        if self.stream_queue is not None:
+            self.stream_queue.put(None)
+            self.stream_queue = None
+        if self.mixer_initialized:
+            if mixer.music.get_busy():
+                mixer.music.stop()
+            mixer.Channel(0).stop()
+        self.is_speaking = False
+    
+    def _is_progressive(self):
+        """流式响应且为PCM格式时，边下载边播放"""
+        return config.TTS_STREAM and config.TTS_RESPONSE_FORMAT == "pcm"
+    
+    def _cache_key(self, cleaned_text):
+        return TTSAudioCache.make_key(cleaned_text, config.TTS_VOICE, config.TTS_SPEED, config.TTS_PITCH, config.TTS_RESPONSE_FORMAT)
+    
+    def _synthesize(self, cleaned_text):
+        """
+        合成语音，优先使用缓存，未命中时调用TTS API，失败返回None
+        :return: 完整的音频数据(bytes)；边下载边播放模式下返回PCM数据块的迭代器
+        """
+        progressive = self._is_progressive()
+        cache = get_tts_audio_cache()
+        cache_key = self._cache_key(cleaned_text) if cache else None
+        if cache:
+            audio_data = cache.get(cache_key)
+            if audio_data is not None:
+                print(f"[TTS] 命中语音缓存: {cleaned_text[:30]}")
+                return iter([audio_data]) if progressive else audio_data
         
-        if config.TTS_REMOVE_EMOJI:
-            # 只删除常见的Emoji表情，使用更安全的范围，避免误删中文
-            emoji_pattern = re.compile(
-                "["
-                "\U0001F600-\U0001F64F"  # 表情符号
-                "\U0001F300-\U0001F5FF"  # 符号和象形文字
-                "\U0001F680-\U0001F6FF"  # 交通和地图符号
-                "\U0001F1E0-\U0001F1FF"  # 旗帜
-                "\U0001F900-\U0001F9FF"  # 补充符号和象形文字
-                "\U0001FA00-\U0001FA6F"  # 扩展A
-                "\U0001FA70-\U0001FAFF"  # 扩展B
-                "]+",
-                flags=re.UNICODE
-            )
-            text = emoji_pattern.sub('', text)
+        print(f"[TTS] 发送文本: {cleaned_text[:100]}")
         
-        if config.TTS_REMOVE_URL:
-            text = re.sub(r'https?://\S+', '', text)
-            text = re.sub(r'www\.\S+', '', text)
+        response = get_http_client().post(
+            self.api_url,
+            headers={
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/json'
+            },
+            json={
+                'model': 'tts-1',
+                'input': cleaned_text,
+                'voice': config.TTS_VOICE,
+                'speed': config.TTS_SPEED,
+                'pitch': config.TTS_PITCH,
+                'stream': config.TTS_STREAM,
+                'response_format': config.TTS_RESPONSE_FORMAT
+            },
+            timeout=30,
+            stream=progressive
+        )
         
-        if config.TTS_REMOVE_REFERENCE:
-            text = re.sub(r'\[\d+\]', '', text)
+        if response.status_code != 200:
+            print(f"[TTS] API错误: {response.status_code}")
+            print(f"[TTS] 响应: {response.text}")
+            return None
+        if progressive:
+            chunks = response.iter_content(chunk_size=4096)
+            return self._cache_chunks(chunks, cache, cache_key) if cache else chunks
+        if cache:
+            cache.set(cache_key, response.content)
+        return response.content
+    
+    def _cache_chunks(self, chunks, cache, cache_key):
+        """边下载边播放时同时累积数据，完整下载后写入缓存，中途打断则不缓存"""
+        received = []
+        for chunk in chunks:
+            received.append(chunk)
+            yield chunk
+        cache.set(cache_key, b"".join(received))
+    
+    def prewarm(self, phrases=None):
+        """
+        后台预先合成常用短语并载入缓存，之后播报这些短语无需等待网络请求
+        :param phrases: 短语列表，默认为唤醒回复和TTS_PREWARM_PHRASES
+        """
+        if not get_tts_audio_cache():
+            return
+        if phrases is None:
+            phrases = [config.WAKE_WORD_RESPONSE] + list(config.TTS_PREWARM_PHRASES)
         
-        if config.TTS_REMOVE_WHITESPACE:
-            # 将多个空白字符替换为单个空格，但保留必要的空格
-            text = re.sub(r'\n+', ' ', text)  # 换行替换为空格
-            text = re.sub(r'\s+', ' ', text)  # 多个空格替换为单个空格
-            text = text.strip()
+        def _prewarm():
+            for phrase in phrases:
+                if not phrase or not phrase.strip():
+                    continue
+                # 与speak相同的清理和分句方式，保证缓存键一致
+                sentences, rest = self.split_sentences(self.clean_text(phrase))
+                for sentence in sentences + [rest]:
+                    cleaned_text = self.clean_text(sentence)
+                    if not cleaned_text:
+                        continue
+                    try:
+                        audio_data = self._synthesize(cleaned_text)
+                        if audio_data is not None and not isinstance(audio_data, (bytes, bytearray)):
+                            # 读完数据块才会写入缓存
+                            for _ in audio_data:
+                                pass
+                    except Exception as e:
+                        print(f"[TTS] 预合成失败: {e}")
+            print("[TTS] 常用短语预合成完成")
         
-        return text
+        threading.Thread(target=_prewarm, daemon=True).start()
     
-    def stop(self):
-        """停止当前播放"""
-        if self.mixer_initialized and mixer.music.get_busy():
-            mixer.music.stop()
-        self.is_speaking = False
+    def _play_audio(self, audio_data, cancel_event):
+        """
+        播放一句音频：解码为Sound排入声道0的队列后即返回，下一句接在上一句之后无缝播放；音频直接从内存加载，不写临时文件
+        最后一句排入后由_wait_for_channel等待播放结束
+        :param cancel_event: 所属播报的打断事件，播报开始时取得，不受之后新播报的影响
+        """
+        if not self.mixer_initialized:
+            print("[TTS] mixer未初始化，无法播放音频")
+            return
+        
+        if not isinstance(audio_data, (bytes, bytearray)):
+            self._play_pcm_stream(audio_data, cancel_event)
+            return
+        
+        if config.TTS_RESPONSE_FORMAT == "pcm":
+            # 裸PCM没有文件头，mixer.music无法解码，与流式PCM一样转换为Sound播放
+            self._play_pcm_stream([audio_data], cancel_event)
+            return
+        
+        sound = None
+        if not self.sound_decode_failed:
+            try:
+                sound = mixer.Sound(file=io.BytesIO(audio_data))
+            except Exception as e:
+                self.sound_decode_failed = True
+                print(f"[TTS] {config.TTS_RESPONSE_FORMAT}音频无法解码为Sound，改用mixer.music逐句播放（句间会有停顿）: {e}")
+        
+        with self.playback_lock:
+            if sound is not None:
+                self._enqueue_sound(mixer.Channel(0), sound, cancel_event)
+                return
+            # mixer.music不能排队：等声道0上的句子播完，且被打断的上一段卸载音频后，才能加载下一段
+            self._wait_while(mixer.Channel(0).get_busy, cancel_event)
+            mixer.music.load(io.BytesIO(audio_data), config.TTS_RESPONSE_FORMAT)
+            mixer.music.play()
+            self._wait_while(mixer.music.get_busy, cancel_event)
+            mixer.music.unload()
+    
+    def _pcm_to_sound(self, pcm_data):
+        """将TTS返回的16位单声道PCM转换为当前mixer格式的Sound"""
+        frequency, _, channels = mixer.get_init()
+        samples = np.frombuffer(pcm_data, dtype=np.int16)
+        if frequency != config.TTS_PCM_SAMPLE_RATE:
+            # 线性插值重采样到mixer的采样率
+            target_length = int(len(samples) * frequency / config.TTS_PCM_SAMPLE_RATE)
+            positions = np.linspace(0, len(samples) - 1, target_length)
+            samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+        if channels > 1:
+            samples = np.repeat(samples[:, None], channels, axis=1)
+        return mixer.Sound(buffer=np.ascontiguousarray(samples).tobytes())
+    
+    def _enqueue_sound(self, channel, sound, cancel_event):
+        """声道空闲时直接播放，否则排在正在播放的音频之后"""
+        if not channel.get_busy():
+            channel.play(sound)
+            return
+        # 声道队列只能容纳一段，等前一段开始播放后再排队
+        self._wait_while(lambda: channel.get_queue() is not None, cancel_event)
+        if not cancel_event.is_set():
+            channel.queue(sound)
+    
+    def _wait_for_channel(self, cancel_event):
+        """等声道0上已排队的音频播放完毕，所属播报被打断时立即返回"""
+        if self.mixer_initialized:
+            self._wait_while(mixer.Channel(0).get_busy, cancel_event)
+    
+    def _play_pcm_stream(self, chunks, cancel_event):
+        """边下载边播放PCM流：每凑够约0.2秒音频就排入声道队列；所属播报被打断后不再读取后续数据"""
+        min_bytes = int(config.TTS_PCM_SAMPLE_RATE * 2 * 0.2)
+        pending = b""
+        
+        with self.playback_lock:
+            channel = mixer.Channel(0)
+            
+            def enqueue(pcm_data):
+                self._enqueue_sound(channel, self._pcm_to_sound(pcm_data), cancel_event)
+            
+            for chunk in chunks:
+                if cancel_event.is_set():
+                    break
+                pending += chunk
+                if len(pending) >= min_bytes:
+                    # 保证按完整的16位采样切分
+                    usable = len(pending) - len(pending) % 2
+                    enqueue(pending[:usable])
+                    pending = pending[usable:]
+            
+            if pending[:len(pending) - len(pending) % 2] and not cancel_event.is_set():
+                enqueue(pending[:len(pending) - len(pending) % 2])
     
     def speak(self, text):
-        """使用TTS API播放语音，支持打断"""
-        # 打断当前播放
-        self.stop()
+        """使用TTS API播放语音，支持打断；长文本按句切分，边合成边播放"""
+        cleaned_text = self.clean_text(text)
+        
+        # 确保文本不为空（清理后只剩链接、Emoji、代码等不朗读的内容时也不播报）
+        if not cleaned_text:
+            print("[TTS] 错误: 清理后文本为空")
+            self.stop()
+            return
         
-        def _speak():
+        generation = self.begin_stream()
+        self.feed(cleaned_text, generation)
+        self.end_stream(generation)
+    
+    def _put_unless_cancelled(self, target_queue, item, generation):
+        """向有容量上限的队列放入数据，播报被打断时放弃，返回是否放入成功"""
+        while generation == self.stream_generation:
             try:
-                self.is_speaking = True
-                
-                # 清理文本
-                cleaned_text = self.clean_text(text)
-                
-                # 如果清理后文本为空，使用原文本
-                if not cleaned_text or not cleaned_text.strip():
-                    cleaned_text = text
-                
-                # 确保文本不为空
-                if not cleaned_text:
-                    print("[TTS] 错误: 文本为空")
-                    return
-                
-                print(f"[TTS] 发送文本: {cleaned_text[:100]}")
-                
-                response = requests.post(
-                    self.api_url,
-                    headers={
-                        'Authorization': f'Bearer {self.api_key}',
-                        'Content-Type': 'application/json'
-                    },
-                    json={
-                        'model': 'tts-1',
-                        'input': cleaned_text,
-                        'voice': config.TTS_VOICE,
-                        'speed': config.TTS_SPEED,
-                        'pitch': config.TTS_PITCH,
-                        'stream': config.TTS_STREAM
-                    },
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as f:
-                        f.write(response.content)
-                        temp_file = f.name
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def begin_stream(self):
+        """
+        开始流式播报：之后通过feed追加文本，遇到完整句子即开始合成
+        合成线程最多预先合成TTS_PREFETCH_COUNT句，播放线程依次播放，第N句播放时第N+1句已在合成
+        :return: 本次播报的编号，传给feed/end_stream后，播报被打断或替换时过期的文本会被丢弃
+        """
+        # 被新播报替换时不算结束，不触发结束回调
+        self._cancel()
+        with self.finished_lock:
+            generation = self.stream_generation
+            # 本次播报自己的打断事件，之后的新播报会换成新的事件，不影响对本次播报的判断
+            cancel_event = self.cancel_event = threading.Event()
+            self.finished_event.clear()
+        sentence_queue = queue.Queue()
+        audio_queue = queue.Queue(maxsize=max(1, config.TTS_PREFETCH_COUNT))
+        self.stream_queue = sentence_queue
+        self.is_speaking = True
+        
+        def _synthesize_loop():
+            try:
+                while generation == self.stream_generation:
+                    sentence = sentence_queue.get()
+                    if sentence is None:
+                        break
                     
-                    if self.mixer_initialized:
-                        mixer.music.load(temp_file)
-                        mixer.music.play()
-                        
-                        while mixer.music.get_busy() and self.is_speaking:
-                            pass
-                        
-                        # 播放完成后卸载音频，释放文件
-                        mixer.music.unload()
-                    else:
-                        print("[TTS] mixer未初始化，无法播放音频")
+                    # 整句都是链接、Emoji、引用标记或代码时跳过，不朗读原文
+                    cleaned_text = self.clean_text(sentence)
+                    if not cleaned_text:
+                        continue
                     
+                    audio_data = self._synthesize(cleaned_text)
+                    if audio_data and not self._put_unless_cancelled(audio_queue, audio_data, generation):
+                        return
+            except Exception as e:
+                print(f"[TTS] 流式合成失败: {e}")
+            # 通知播放线程没有更多音频
+            self._put_unless_cancelled(audio_queue, None, generation)
+        
+        def _play_loop():
+            try:
+                while generation == self.stream_generation:
                     try:
-                        # 确保文件完全释放后再删除
-                        import time
-                        time.sleep(0.1)
-                        if os.path.exists(temp_file):
-                            os.unlink(temp_file)
+                        audio_data = audio_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if audio_data is None:
+                        break
+                    try:
+                        self._play_audio(audio_data, cancel_event)
                     except Exception as e:
-                        print(f"[TTS] 删除临时文件失败: {e}")
-                else:
-                    print(f"[TTS] API错误: {response.status_code}")
-                    print(f"[TTS] 响应: {response.text}")
-            except Exception as e:
-                print(f"[TTS] 播放失败: {e}")
+                        # 单句播放失败时跳过该句，继续播放后面的句子
+                        print(f"[TTS] 播放失败: {e}")
+                # 各句排入声道后即返回，等最后一句播完再结束
+                self._wait_for_channel(cancel_event)
             finally:
-                self.is_speaking = False
-                # 清理线程引用
-                self.current_thread = None
+                if generation == self.stream_generation:
+                    self.is_speaking = False
+                    # 清理线程引用
+                    self.current_thread = None
+                self._notify_finished(generation)
         
-        self.current_thread = threading.Thread(target=_speak, daemon=True)
-        self.current_thread.start()
\ No newline at end of file
+        threading.Thread(target=_synthesize_loop, daemon=True).start()
+        self.current_thread = threading.Thread(target=_play_loop, daemon=True)
+        self.current_thread.start()
+        return generation
+    
+    @staticmethod
+    def split_sentences(text):
+        """
+        按句末标点切分文本；代码块内部和URL中的标点不切分，尚未闭合的代码块留在末尾等待后续文本
+        :return: (完整句子列表, 末尾尚未结束的文本)
+        """
+        sentences = []
+        start = 0
+        for match in SENTENCE_SPLIT_PATTERN.finditer(text):
+            if match.group(1) is None:
+                continue
+            sentence = text[start:match.end()]
+            if sentence.strip():
+                sentences.append(sentence)
+            start = match.end()
+        return sentences, text[start:]
+    
+    def feed(self, text_delta, generation=None):
+        """
+        追加流式文本，切出已完整的句子送入合成队列
+        :param generation: begin_stream返回的编号，不是当前播报时忽略（如被打断后仍在生成的旧回复）
+        """
+        if self.stream_queue is None or (generation is not None and generation != self.stream_generation):
+            return
+        sentences, self.stream_buffer = self.split_sentences(self.stream_buffer + text_delta)
+        for sentence in sentences:
+            self.stream_queue.put(sentence)
+    
+    def end_stream(self, generation=None):
+        """结束流式播报，剩余文本作为最后一句播放"""
+        if self.stream_queue is None or (generation is not None and generation != self.stream_generation):
+            return
+        if self.stream_buffer.strip():
+            self.stream_queue.put(self.stream_buffer)
+        self.stream_buffer = ""
+        self.stream_queue.put(None)
+        self.stream_queue = None
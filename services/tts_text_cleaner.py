@@ -0,0 +1,94 @@
+import re
+import threading
+import config
+
+# 各类需要清理的内容，(名称, 正则, 是否保留分组中的文本)；保留文本的正则恰好有一个分组，其余不含分组
+MARKDOWN_RULES = [
+    # 行首的标题、列表标记放在最前，避免"* 列表项"被当成斜体
+    ("line_prefix", r'^(?:#+\s+|\s*[-*+]\s+|\s*\d+\.\s+)', False),
+    ("code_block", r'```[\s\S]*?```', False),
+    ("bold", r'\*\*(.+?)\*\*', True),
+    ("italic", r'\*(.+?)\*', True),
+    ("underline_bold", r'__(.+?)__', True),
+    ("underline_italic", r'_(.+?)_', True),
+    ("strike", r'~~(.+?)~~', True),
+    ("inline_code", r'`(.+?)`', True),
+]
+# 只删除常见的Emoji表情，使用更安全的范围，避免误删中文
+EMOJI_RULE = ("emoji", (
+    "["
+    "\U0001F600-\U0001F64F"  # 表情符号
+    "\U0001F300-\U0001F5FF"  # 符号和象形文字
+    "\U0001F680-\U0001F6FF"  # 交通和地图符号
+    "\U0001F1E0-\U0001F1FF"  # 旗帜
+    "\U0001F900-\U0001F9FF"  # 补充符号和象形文字
+    "\U0001FA00-\U0001FA6F"  # 扩展A
+    "\U0001FA70-\U0001FAFF"  # 扩展B
+    "]+"
+), False)
+URL_RULE = ("url", r'https?://\S+|www\.\S+', False)
+REFERENCE_RULE = ("reference", r'\[\d+\]', False)
+INLINE_MARKUP_NAMES = ("bold", "italic", "underline_bold", "underline_italic", "strike", "inline_code")
+
+def _build_pattern(rules):
+    """
+    把多条规则合并为一个正则，不额外包裹分组，以保留正则引擎按首字符快速跳过的优化
+    需要保留文本的规则恰好有一个分组，其余规则没有分组，因此匹配的lastindex即为要保留的分组
+    """
+    if not rules:
+        return None
+    return re.compile("|".join(pattern for _, pattern, _ in rules), re.MULTILINE)
+
+def _keep_text(match):
+    return match.group(match.lastindex) if match.lastindex else ''
+
+class TextCleaner:
+    """
+    TTS文本清理：按开关把所有清理规则合并成一个预编译的正则，
+    一次扫描完成Markdown、Emoji、URL和引用标记的清理，再用str.split合并空白
+    """
+    def __init__(self, remove_markdown=True, remove_emoji=True, remove_url=True,
+                 remove_reference=True, remove_whitespace=True):
+        rules = []
+        if remove_markdown:
+            rules.extend(MARKDOWN_RULES)
+        if remove_emoji:
+            rules.append(EMOJI_RULE)
+        if remove_url:
+            rules.append(URL_RULE)
+        if remove_reference:
+            rules.append(REFERENCE_RULE)
+        self.remove_whitespace = remove_whitespace
+        self.pattern = _build_pattern(rules)
+        # 保留下来的文本中可能还嵌套着行内标记（如 **加粗里的`代码`**），再清理一遍行内标记
+        self.inline_pattern = _build_pattern([rule for rule in rules if rule[0] in INLINE_MARKUP_NAMES])
+
+    def clean(self, text):
+        if self.pattern is not None:
+            text = self.pattern.sub(_keep_text, text)
+        if self.inline_pattern is not None:
+            text = self.inline_pattern.sub(_keep_text, text)
+        if self.remove_whitespace:
+            text = " ".join(text.split())
+        return text
+
+
+_cleaner = None
+_cleaner_flags = None
+_cleaner_lock = threading.Lock()
+
+def get_text_cleaner():
+    """获取与当前TTS_REMOVE_*设置对应的TextCleaner，设置变化后才重新构建"""
+    global _cleaner, _cleaner_flags
+    flags = (config.TTS_REMOVE_MARKDOWN, config.TTS_REMOVE_EMOJI, config.TTS_REMOVE_URL,
+             config.TTS_REMOVE_REFERENCE, config.TTS_REMOVE_WHITESPACE)
+    if flags != _cleaner_flags:
+        with _cleaner_lock:
+            if flags != _cleaner_flags:
+                _cleaner = TextCleaner(*flags)
+                _cleaner_flags = flags
+    return _cleaner
+
+def clean_text(text):
+    return get_text_cleaner().clean(text)
+
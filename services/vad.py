@@ -0,0 +1,143 @@
+import numpy as np
+import config
+
+try:
+    import webrtcvad
+    WEBRTCVAD_AVAILABLE = True
+except ImportError:
+    WEBRTCVAD_AVAILABLE = False
+
+FRAME_MS = 20  # 判决帧长（毫秒）
+ONSET_FRAMES = 2  # 连续多少帧为语音才进入说话状态，过滤按键、咳嗽等短促噪声
+HANGOVER_SECONDS = 0.2  # 语音帧结束后保持说话状态的时长，避免字与字之间的短暂停顿被判为静音
+ENERGY_RATIO = 1.8  # 帧能量超过噪音基线多少倍视为语音
+ZCR_MAX = 0.35  # 过零率高于此值的帧（风扇、气流等嘶声）需要更高的能量才算语音
+
+class BaseVAD:
+    """
+    语音活动检测：把任意长度的音频块切成20毫秒的帧逐帧判决，
+    再经过起始确认和拖尾（hangover）平滑，输出每块是否处于说话状态
+    子类实现frame_decisions，对一批帧给出原始判决
+    """
+    def __init__(self, rate=16000):
+        self.rate = rate
+        self.frame_size = rate * FRAME_MS // 1000
+        self.hangover_frames = int(HANGOVER_SECONDS * 1000 / FRAME_MS)
+        self.remainder = np.zeros(0, dtype=np.int16)
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self.speech_run = 0  # 连续语音帧数
+        self.hangover = 0  # 剩余的拖尾帧数
+
+    def frame_decisions(self, frames):
+        """
+        :param frames: 形状为(帧数, 帧长)的int16数组
+        :return: 每帧是否为语音的bool数组
+        """
+        raise NotImplementedError
+
+    def process(self, block):
+        """送入一块16位单声道PCM，返回该块内是否处于说话状态"""
+        samples = np.concatenate((self.remainder, np.frombuffer(block, dtype=np.int16)))
+        count = len(samples) // self.frame_size
+        self.remainder = samples[count * self.frame_size:]
+        if count == 0:
+            return self.in_speech
+
+        block_speech = False
+        for is_speech in self.frame_decisions(samples[:count * self.frame_size].reshape(count, self.frame_size)):
+            if is_speech:
+                self.speech_run += 1
+                if self.speech_run >= ONSET_FRAMES:
+                    self.in_speech = True
+                    self.hangover = self.hangover_frames
+            else:
+                self.speech_run = 0
+                if self.hangover > 0:
+                    self.hangover -= 1
+                else:
+                    self.in_speech = False
+            block_speech = block_speech or self.in_speech
+        return block_speech
+
+class EnergyVAD(BaseVAD):
+    """
+    能量+过零率检测（向量化NumPy）：帧平均幅度超过噪音基线的ENERGY_RATIO倍为语音，
+    过零率很高的帧需要两倍的能量；噪音基线在非语音帧上持续更新（下降快、上升慢）
+    min_level为额外的能量下限（如扬声器播报时的回声音量），只影响判决，不计入噪音基线
+    """
+    def __init__(self, rate=16000, noise_level=None):
+        self.noise_level = noise_level
+        self.min_level = 0.0
+        super().__init__(rate)
+
+    def frame_decisions(self, frames):
+        energy = np.abs(frames.astype(np.int32)).mean(axis=1)
+        zcr = np.count_nonzero(np.diff(np.signbit(frames), axis=1), axis=1) / self.frame_size
+        if self.noise_level is None:
+            self.noise_level = float(energy.min())
+        noise = max(self.noise_level, 1.0)
+        threshold = np.where(zcr < ZCR_MAX, noise * ENERGY_RATIO, noise * ENERGY_RATIO * 2)
+        above_noise = energy > threshold
+
+        for level, is_loud in zip(energy, above_noise):
+            if level < self.noise_level:
+                self.noise_level = 0.8 * self.noise_level + 0.2 * level
+            elif not is_loud:
+                self.noise_level = 0.995 * self.noise_level + 0.005 * level
+        if self.min_level > 0:
+            return above_noise & (energy > self.min_level)
+        return above_noise
+
+class WebRTCVAD(BaseVAD):
+    """WebRTC的GMM语音检测（需要安装webrtcvad），噪声环境下比能量检测更稳定"""
+    def __init__(self, rate=16000, aggressiveness=2):
+        self.vad = webrtcvad.Vad(aggressiveness)
+        super().__init__(rate)
+
+    def frame_decisions(self, frames):
+        return np.array([self.vad.is_speech(frame.tobytes(), self.rate) for frame in frames])
+
+def create_vad(rate=16000, noise_level=None):
+    """按VAD_ENGINE设置创建语音检测器，webrtcvad未安装时回退到能量检测"""
+    if config.VAD_ENGINE == "webrtc":
+        if WEBRTCVAD_AVAILABLE:
+            return WebRTCVAD(rate)
+        print("[VAD] 未安装webrtcvad，使用能量检测")
+    return EnergyVAD(rate, noise_level)
+
+class Endpointer:
+    """
+    自适应断句：说话结束所需的静音时长随本次说话中出现过的停顿调整，
+    一口气说完的短指令在min_silence后结束，说话时有较长停顿的用户获得更长的等待，最多max_silence
+    """
+    def __init__(self, min_silence, max_silence):
+        self.min_silence = min_silence
+        self.max_silence = max(min_silence, max_silence)
+        self.speech_time = 0.0
+        self.silence = 0.0
+        self.longest_pause = 0.0
+
+    def required_silence(self):
+        # 刚开口（如"嗯……"）时按最长静音等待，避免用户还在组织语言就被截断
+        if self.speech_time < 0.3:
+            return self.max_silence
+        return min(self.max_silence, max(self.min_silence, self.longest_pause * 1.5))
+
+    def update(self, is_speech, seconds):
+        """
+        :param seconds: 本块音频的时长
+        :return: 说话是否已结束
+        """
+        if is_speech:
+            if self.speech_time > 0:
+                self.longest_pause = max(self.longest_pause, self.silence)
+            self.silence = 0.0
+            self.speech_time += seconds
+            return False
+        if self.speech_time == 0:
+            return False
+        self.silence += seconds
+        return self.silence >= self.required_silence()
@@ -1,5 +1,5 @@
 import pyautogui
-import requests
+from services.http_client import get_http_client
 import base64
 import config
 import os
@@ -34,7 +34,7 @@ class VisionService:
             ]
         }
         
-        response = requests.post(url, headers=headers, json=data)
+        response = get_http_client().post(url, headers=headers, json=data)
         result = response.json()
         return result['choices'][0]['message']['content']
     
@@ -1,8 +1,14 @@
-import requests
+from services.http_client import get_http_client
 import config
 import os
 import sys
+import io
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from services.local_asr import LocalASR
+from services.vosk_model import get_vosk_model_manager
+from services.audio_capture import get_audio_capture, BLOCK_SIZE
+from services.vad import create_vad, Endpointer
 
 try:
     import pyaudio
@@ -14,10 +20,13 @@ except ImportError:
 class VoiceRecognition:
     def __init__(self):
         if PYAUDIO_AVAILABLE:
-            self.chunk = 1024
+            self.chunk = BLOCK_SIZE
             self.format = pyaudio.paInt16
             self.channels = 1
             self.rate = 16000
+        if config.ASR_POLICY != "online":
+            # 使用本地识别时提前在后台加载模型
+            get_vosk_model_manager().load_async()
     
     @staticmethod
     def get_microphone_list():
@@ -40,74 +49,61 @@ class VoiceRecognition:
         except:
             return []
     
-    def record_audio(self, duration=30):
+    def _capture(self, duration, preroll_since=None):
+        """
+        录音并逐块产出 (音频数据, 是否为语音)
+        录音从采集总线中最近RECORD_PREROLL_SECONDS秒的预录音频开始，不会漏掉开口的第一个字；
+        语音检测（VAD）以采集总线持续估计的噪音基线为起点，无需单独校准
+        检测到语音后按自适应断句判断说话结束（静音VAD_MIN_SILENCE到SILENCE_DURATION秒），或达到最大时长时结束
+        :param duration: 最大录音时长（秒）
+        :param preroll_since: 预录音频只取该时间之后的部分（如唤醒回复播完的时间），避免录进播报声音
+        """
+        capture = get_audio_capture()
+        # 从共享的采集总线读取音频，麦克风已由唤醒词检测打开时无需再打开设备
+        with capture.subscribe(preroll=config.RECORD_PREROLL_SECONDS, since=preroll_since) as subscription:
+            noise_baseline = capture.noise_floor()
+            vad = create_vad(self.rate, noise_baseline)
+            endpointer = Endpointer(config.VAD_MIN_SILENCE, config.SILENCE_DURATION)
+            chunk_seconds = self.chunk / self.rate
+            max_chunks = int(duration / chunk_seconds)
+            
+            if noise_baseline is not None:
+                print(f"[录音] 环境噪音基线: {noise_baseline:.0f}")
+            print(f"[录音] 开始录音，静音{config.VAD_MIN_SILENCE}~{config.SILENCE_DURATION}秒后自动停止")
+            
+            for i in range(max_chunks):
+                data = subscription.read(timeout=5)
+                if data is None:
+                    raise RuntimeError("麦克风没有音频输入")
+                
+                is_speech = vad.process(data)
+                yield data, is_speech
+                if endpointer.update(is_speech, chunk_seconds):
+                    print(f"[录音] 检测到{endpointer.silence:.1f}秒静音，停止录音")
+                    break
+    
+    def _wav_bytes(self, frames):
+        """将录制的PCM数据封装为内存中的WAV"""
+        buffer = io.BytesIO()
+        wf = wave.open(buffer, 'wb')
+        wf.setnchannels(self.channels)
+        wf.setsampwidth(2)  # paInt16
+        wf.setframerate(self.rate)
+        wf.writeframes(b''.join(frames))
+        wf.close()
+        return buffer.getvalue()
+    
+    def record_audio(self, duration=30, preroll_since=None):
         """
         录音，检测到静音后自动停止
         :param duration: 最大录音时长（秒）
+        :param preroll_since: 预录音频只取该时间之后的部分
         """
-        silence_duration = config.SILENCE_DURATION
         if not PYAUDIO_AVAILABLE:
             return "语音录制功能需要安装pyaudio库，请运行: conda install -c anaconda pyaudio"
         
         try:
-            p = pyaudio.PyAudio()
-            device_index = config.MICROPHONE_DEVICE_INDEX
-            stream = p.open(format=self.format, channels=self.channels,
-                           rate=self.rate, input=True, frames_per_buffer=self.chunk,
-                           input_device_index=device_index)
-            print(f"[录音] 使用麦克风设备: {device_index if device_index is not None else '默认'}")
-            
-            # 环境噪音校准（采样0.5秒）
-            print("[录音] 正在校准环境噪音...")
-            calibration_chunks = int(self.rate / self.chunk * 0.5)
-            noise_samples = []
-            for _ in range(calibration_chunks):
-                data = stream.read(self.chunk)
-                audio_data = np.frombuffer(data, dtype=np.int16)
-                noise_samples.append(np.abs(audio_data).mean())
-            
-            # 计算环境噪音基线和动态阈值
-            noise_baseline = np.mean(noise_samples)
-            silence_threshold = noise_baseline * 1.5  # 阈值为噪音基线的1.5倍
-            print(f"[录音] 环境噪音基线: {noise_baseline:.0f}, 静音阈值: {silence_threshold:.0f}")
-            
-            frames = []
-            silent_chunks = 0
-            speech_detected = False  # 是否检测到过语音
-            max_silent_chunks = int(self.rate / self.chunk * silence_duration)
-            max_chunks = int(self.rate / self.chunk * duration)
-            
-            print(f"[录音] 开始录音，静音{silence_duration}秒后自动停止")
-            
-            for i in range(max_chunks):
-                data = stream.read(self.chunk)
-                frames.append(data)
-                
-                # 计算音量
-                audio_data = np.frombuffer(data, dtype=np.int16)
-                volume = np.abs(audio_data).mean()
-                
-                # 检测是否为语音
-                if volume > silence_threshold:
-                    speech_detected = True
-                    silent_chunks = 0
-                else:
-                    # 只有在检测到语音后才开始计算静音
-                    if speech_detected:
-                        silent_chunks += 1
-                        if silent_chunks >= max_silent_chunks:
-                            print(f"[录音] 检测到{silence_duration}秒静音，停止录音")
-                            break
-            
-            try:
-                stream.stop_stream()
-                stream.close()
-            except Exception as e:
-                print(f"[录音] 关闭音频流失败: {e}")
-            try:
-                p.terminate()
-            except Exception as e:
-                print(f"[录音] 终止PyAudio失败: {e}")
+            frames = [data for data, _ in self._capture(duration, preroll_since)]
             
             # 使用正确的临时目录路径
             if getattr(sys, 'frozen', False):
@@ -116,37 +112,102 @@ class VoiceRecognition:
                 temp_dir = "temp"
             os.makedirs(temp_dir, exist_ok=True)
             filename = os.path.join(temp_dir, "temp_audio.wav")
-            wf = wave.open(filename, 'wb')
-            wf.setnchannels(self.channels)
-            wf.setsampwidth(p.get_sample_size(self.format))
-            wf.setframerate(self.rate)
-            wf.writeframes(b''.join(frames))
-            wf.close()
+            with open(filename, 'wb') as f:
+                f.write(self._wav_bytes(frames))
             return filename
         except Exception as e:
-            # 确保资源清理
-            try:
-                if 'stream' in locals():
-                    stream.stop_stream()
-                    stream.close()
-                if 'p' in locals():
-                    p.terminate()
-            except:
-                pass
             return f"录音失败: {str(e)}"
     
+    def recognize(self, duration=30, preroll_since=None):
+        """
+        边录音边识别，返回识别文本；识别方式由ASR_POLICY决定：
+        online 在线识别；local 本地Vosk识别；local_first 本地优先，置信度低于ASR_LOCAL_MIN_CONFIDENCE时改用在线识别
+        在线识别时（VOICE_STREAMING_ENABLED），说话中停顿超过VOICE_STREAMING_PAUSE秒即在后台上传已录制的音频，
+        若停顿一直持续到录音结束，结束时识别结果已基本就绪
+        :param duration: 最大录音时长（秒）
+        :param preroll_since: 预录音频只取该时间之后的部分
+        """
+        if not PYAUDIO_AVAILABLE:
+            return "语音录制功能需要安装pyaudio库，请运行: conda install -c anaconda pyaudio"
+        
+        policy = config.ASR_POLICY
+        local = None
+        if policy in ("local", "local_first"):
+            local = LocalASR(self.rate)
+            try:
+                # 本地优先时不等待仍在加载的模型，先用在线识别
+                if not local.start(timeout=None if policy == "local" else 0):
+                    local = None
+            except Exception as e:
+                print(f"[语音识别] 本地识别初始化失败: {e}")
+                local = None
+            if local is None:
+                if policy == "local":
+                    return "语音识别失败: 本地Vosk模型不可用"
+                print("[语音识别] 本地模型不可用，改用在线识别")
+        
+        streaming = config.VOICE_STREAMING_ENABLED and local is None
+        pause_chunks = max(1, int(self.rate / self.chunk * config.VOICE_STREAMING_PAUSE))
+        executor = ThreadPoolExecutor(max_workers=2)
+        frames = []
+        speculative = None  # 最近一次提前识别的Future
+        speech_detected = False
+        silent_chunks = 0
+        try:
+            try:
+                for data, is_speech in self._capture(duration, preroll_since):
+                    frames.append(data)
+                    if local is not None:
+                        local.accept(data)
+                    if is_speech:
+                        speech_detected = True
+                        silent_chunks = 0
+                        # 停顿后又开始说话，之前提前识别的结果已过时
+                        speculative = None
+                        continue
+                    silent_chunks += 1
+                    if streaming and speech_detected and silent_chunks == pause_chunks:
+                        print(f"[语音识别] 检测到停顿，提前识别已录制的 {len(frames) * self.chunk / self.rate:.1f} 秒音频")
+                        speculative = executor.submit(self._transcribe_wav, self._wav_bytes(frames))
+            except Exception as e:
+                return f"录音失败: {str(e)}"
+            
+            if local is not None:
+                text, confidence = local.finish()
+                print(f"[语音识别] 本地识别: {text} (置信度 {confidence:.2f})")
+                if policy == "local" or (text and confidence >= config.ASR_LOCAL_MIN_CONFIDENCE):
+                    return text
+                print("[语音识别] 本地识别置信度较低，改用在线识别")
+            
+            try:
+                if speculative is not None:
+                    text = speculative.result()
+                else:
+                    text = self._transcribe_wav(self._wav_bytes(frames))
+            except Exception as e:
+                return f"语音识别失败: {str(e)}"
+            print(f"[语音识别] {text}")
+            return text
+        finally:
+            # 不等待已过时的识别请求
+            executor.shutdown(wait=False)
+    
+    def _transcribe_wav(self, wav_data):
+        """上传WAV数据进行识别，返回识别文本"""
+        url = f"{config.SILICONFLOW_BASE_URL}/audio/transcriptions"
+        headers = {"Authorization": f"Bearer {config.SILICONFLOW_API_KEY}"}
+        files = {'file': ('audio.wav', wav_data, 'audio/wav')}
+        data = {'model': config.VOICE_MODEL}
+        response = get_http_client().post(url, headers=headers, files=files, data=data)
+        return response.json().get('text', '')
+    
     def transcribe(self, audio_file):
         if isinstance(audio_file, str) and ("需要安装" in audio_file or "录音失败" in audio_file):
             return audio_file
         
         try:
-            url = f"{config.SILICONFLOW_BASE_URL}/audio/transcriptions"
-            headers = {"Authorization": f"Bearer {config.SILICONFLOW_API_KEY}"}
             with open(audio_file, 'rb') as f:
-                files = {'file': f}
-                data = {'model': config.VOICE_MODEL}
-                response = requests.post(url, headers=headers, files=files, data=data)
-            text = response.json().get('text', '')
+                text = self._transcribe_wav(f.read())
             print(f"[语音识别] {text}")
             return text
         except Exception as e:
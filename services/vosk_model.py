@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import threading
+import config
+
+try:
+    from vosk import Model
+    VOSK_AVAILABLE = True
+except ImportError:
+    VOSK_AVAILABLE = False
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+PROGRESS_INTERVAL = 2.0  # 加载过程中每隔多少秒报告一次进度
+
+def resident_memory():
+    """当前进程的常驻内存（字节），无法获取时返回None"""
+    if PSUTIL_AVAILABLE:
+        return psutil.Process().memory_info().rss
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        try:
+            get_info = ctypes.windll.psapi.GetProcessMemoryInfo
+            get_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+            if get_info(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+        except Exception:
+            pass
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class VoskModelManager:
+    """
+    Vosk模型管理：唤醒词检测和本地识别共享同一个模型实例
+    模型在后台线程中加载并定期报告进度，不阻塞调用方；路径变化时重新加载，不再需要时卸载释放内存
+    每次加载、卸载或加载失败都会递增generation并通知等待者，使用方据此更换模型，无需轮询模型路径
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.model = None
+        self.path = None  # 当前模型（或正在加载的模型）的路径
+        self.loading = False
+        self.error = None
+        self.generation = 0
+        self.load_seconds = None
+        self.resident_delta = None  # 加载前后进程常驻内存的差值（字节）
+
+    def load_async(self, path=None, retry=False):
+        """
+        在后台开始加载模型（已加载或正在加载同一路径时不重复加载）
+        :param retry: 同一路径上次加载失败时是否重试（如保存设置后）；否则直到路径变化前都不再尝试
+        """
+        path = path or config.VOSK_MODEL_PATH
+        with self.condition:
+            if self.path == path and (self.model is not None or self.loading or (self.error and not retry)):
+                return
+            self.path = path
+            self.model = None
+            self.error = None
+            self.loading = True
+            self.generation += 1
+            generation = self.generation
+            self.condition.notify_all()
+        threading.Thread(target=self._load, args=(path, generation), daemon=True).start()
+
+    def _load(self, path, generation):
+        model = None
+        error = None
+        if not VOSK_AVAILABLE:
+            error = "未安装vosk库"
+        elif not os.path.exists(path):
+            error = f"模型路径不存在: {path}"
+
+        started = time.time()
+        rss_before = resident_memory()
+        if error is None:
+            print(f"[Vosk] 开始加载模型: {path}（{_directory_size(path) / 1024 / 1024:.0f} MB）")
+            done = threading.Event()
+
+            def _report_progress():
+                while not done.wait(PROGRESS_INTERVAL):
+                    print(f"[Vosk] 正在加载模型... 已用时 {time.time() - started:.0f}秒")
+
+            threading.Thread(target=_report_progress, daemon=True).start()
+            try:
+                model = Model(path)
+            except Exception as e:
+                error = f"模型加载失败: {e}"
+            finally:
+                done.set()
+
+        with self.condition:
+            if generation != self.generation:
+                # 加载期间路径已变化或已卸载，丢弃本次结果
+                return
+            self.loading = False
+            self.model = model
+            self.error = error
+            self.generation += 1
+            if model is not None:
+                self.load_seconds = time.time() - started
+                rss_after = resident_memory()
+                self.resident_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            self.condition.notify_all()
+
+        if error:
+            print(f"[Vosk错误] {error}")
+        else:
+            print(f"[Vosk] {self.describe()}")
+
+    def get(self, timeout=None):
+        """
+        获取当前设置路径的模型，尚未加载时开始加载
+        :param timeout: 正在加载时最多等待多少秒，None表示等到加载结束，0表示不等待
+        :return: 模型，不可用（未安装、路径不存在、加载失败或仍在加载）时返回None
+        """
+        self.load_async()
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while self.loading:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return self.model
+
+    def wait_for_change(self, generation, timeout=None):
+        """等待模型状态（加载完成、失败、路径变化或卸载）相对generation发生变化，返回是否已变化"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.generation != generation, timeout)
+
+    def unload(self):
+        """卸载模型；识别器仍持有模型时，其内存在识别器释放后回收"""
+        with self.condition:
+            if self.model is None and not self.loading:
+                return
+            self.model = None
+            self.path = None
+            self.loading = False
+            self.error = None
+            self.generation += 1
+            self.condition.notify_all()
+        print("[Vosk] 模型已卸载")
+
+    def release_if_unused(self):
+        """唤醒词检测和本地识别都未启用时卸载模型"""
+        if not config.WAKE_WORD_ENABLED and config.ASR_POLICY == "online":
+            self.unload()
+
+    def diagnostics(self):
+        """模型状态、加载耗时和占用的常驻内存"""
+        with self.condition:
+            if self.loading:
+                status = "加载中"
+            elif self.model is not None:
+                status = "已加载"
+            elif self.error:
+                status = "不可用"
+            else:
+                status = "未加载"
+            return {
+                "status": status,
+                "path": self.path,
+                "error": self.error,
+                "load_seconds": self.load_seconds if self.model is not None else None,
+                "resident_delta": self.resident_delta if self.model is not None else None,
+                "process_resident": resident_memory()
+            }
+
+    def describe(self):
+        """诊断信息的一行文字说明"""
+        info = self.diagnostics()
+        text = f"模型{info['status']}"
+        if info["error"]:
+            text += f"（{info['error']}）"
+        if info["load_seconds"] is not None:
+            text += f"，加载用时 {info['load_seconds']:.1f}秒"
+        if info["resident_delta"] is not None:
+            text += f"，常驻内存增加 {info['resident_delta'] / 1024 / 1024:.0f} MB"
+        if info["process_resident"] is not None:
+            text += f"，进程常驻内存 {info['process_resident'] / 1024 / 1024:.0f} MB"
+        return text
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_vosk_model_manager():
+    """获取进程内共享的VoskModelManager实例"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = VoskModelManager()
+    return _manager
+
+def get_vosk_model(timeout=None):
+    """
+    获取进程内共享的Vosk模型（唤醒词检测和本地识别共用同一实例），模型路径变化时重新加载
+    vosk未安装、模型路径不存在或等待超时时返回None
+    """
+    return get_vosk_model_manager().get(timeout)
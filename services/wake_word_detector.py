@@ -1,31 +1,47 @@
-import pyaudio
-from vosk import Model, KaldiRecognizer
+from vosk import KaldiRecognizer
+from services.vosk_model import get_vosk_model_manager
+from services.audio_capture import get_audio_capture, BLOCK_SIZE
+from services.vad import EnergyVAD
+from collections import deque
+import numpy as np
 import json
 import threading
 import config
-import os
+
+GATE_PREROLL_SECONDS = 0.5  # 门控打开时一并送入识别器的之前音频，避免漏掉唤醒词的开头
+GATE_HANGOVER_SECONDS = 1.0  # 安静多久后关闭门控
+ECHO_WINDOW_SECONDS = 3.0  # 估计播报回声音量时参考最近多少秒的麦克风音量
+MODEL_WAIT_SECONDS = 0.5  # 等待模型加载时每隔多少秒检查一次是否已停止
 
 class WakeWordDetector:
     def __init__(self):
         self.running = False
         self.paused = False
         self.thread = None
+        self.stop_event = None  # 当前检测线程的停止事件，每次启动新建，旧线程只看自己的事件
         self.callback = None
-        self.model = None
-        self.audio_interface = None
-        self.audio_stream = None
+        self.playback_active = None
+        self.keyword_mode = False
+        self.phrases = {}
         self.stream_lock = __import__('threading').Lock()
         
-    def start(self, callback):
-        """启动唤醒词检测"""
+    def start(self, callback, playback_active=None):
+        """
+        启动唤醒词检测
+        :param callback: 检测到唤醒短语时调用 callback(短语, 动作)
+        :param playback_active: 返回当前是否在播报语音的函数；播报期间按回声音量提高门限（WAKE_BARGE_IN关闭时暂停检测）
+        """
         if self.running or not config.WAKE_WORD_ENABLED:
             return
         
         self.callback = callback
+        self.playback_active = playback_active
         self.running = True
-        self.thread = threading.Thread(target=self._detect_loop, daemon=True)
+        # 刚停止的旧线程可能还在等待模型或音频，它只检查自己的停止事件，会自行退出
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._detect_loop, args=(self.stop_event,), daemon=True)
         self.thread.start()
-        print(f"[唤醒词] 已启动，唤醒词: {config.WAKE_WORD}")
+        print(f"[唤醒词] 已启动，唤醒短语: {', '.join(self.wake_phrases())}")
     
     def pause(self):
         """暂停唤醒词检测"""
@@ -41,172 +57,186 @@ class WakeWordDetector:
     
     def stop(self):
         """停止唤醒词检测"""
+        # 检测线程退出时会关闭自己的采集订阅
         self.running = False
-        if self.audio_stream:
-            self.audio_stream.stop_stream()
-            self.audio_stream.close()
-        if self.audio_interface:
-            self.audio_interface.terminate()
+        if self.stop_event:
+            self.stop_event.set()
         print("[唤醒词] 已停止")
     
-    def _detect_loop(self):
-        """检测循环"""
-        import time
-        
-        while self.running:
+    @staticmethod
+    def wake_phrases():
+        """
+        所有唤醒短语及对应动作（去掉空格后的短语 -> 动作）
+        WAKE_WORD对应"voice"（开始语音指令），其余来自WAKE_WORD_ACTIONS
+        """
+        phrases = {}
+        for phrase, action in [(config.WAKE_WORD, "voice")] + list(config.WAKE_WORD_ACTIONS.items()):
+            phrase = phrase.replace(" ", "")
+            if phrase and phrase not in phrases:
+                phrases[phrase] = action
+        return phrases
+    
+    def _grammar(self):
+        """
+        关键词模式的识别语法：所有唤醒短语共用一个语法，一次解码同时匹配，
+        每个短语包括原写法及逐字拆开的写法（模型词表中没有整词时按字识别），其余语音都归为[unk]
+        """
+        grammar = []
+        for phrase in self.phrases:
+            grammar.append(phrase)
+            grammar.append(" ".join(phrase))
+        return list(dict.fromkeys(grammar)) + ["[unk]"]
+    
+    def _create_recognizer(self, model):
+        """关键词模式下创建只识别唤醒短语的受限识别器，解码开销远小于开放词表识别"""
+        self.phrases = self.wake_phrases()
+        self.keyword_mode = config.WAKE_WORD_MODE == "keyword"
+        if self.keyword_mode:
+            return KaldiRecognizer(model, 16000, json.dumps(self._grammar(), ensure_ascii=False))
+        return KaldiRecognizer(model, 16000)
+    
+    def _feed(self, recognizer, data):
+        """送入一块音频并检查识别结果"""
+        if recognizer.AcceptWaveform(data):
+            text = json.loads(recognizer.Result()).get("text", "")
+            if text:
+                print(f"[唤醒词识别] {text}")
+        elif self.keyword_mode:
+            # 关键词模式下检查中间结果，说出唤醒词即可触发，无需等待停顿
+            text = json.loads(recognizer.PartialResult()).get("partial", "")
+        else:
+            return
+        self._check(text, recognizer)
+    
+    def _check(self, text, recognizer):
+        phrase = self._match(text)
+        if phrase:
+            action = self.phrases[phrase]
+            print(f"[唤醒词] 检测到唤醒短语: {phrase} -> {action}")
+            # 清空识别器状态，避免同一句话的后续中间结果重复触发
+            recognizer.Reset()
+            if self.callback:
+                self.callback(phrase, action)
+    
+    def _match(self, text):
+        """返回识别结果中出现的唤醒短语（较长的优先），没有时返回None"""
+        if not text:
+            return None
+        # 移除空格进行匹配，支持识别结果中有空格的情况
+        text = text.replace(" ", "")
+        for phrase in sorted(self.phrases, key=len, reverse=True):
+            if phrase in text:
+                return phrase
+        return None
+    
+    def _detect_loop(self, stop_event):
+        """
+        检测循环：采集订阅和模型引用都属于本线程，线程退出时关闭订阅，
+        重启检测时新旧线程不会共享订阅或互相关闭对方的资源
+        """
+        subscription = None
+        try:
+            subscription = self._detect(stop_event)
+        finally:
+            if subscription:
+                subscription.close()
+    
+    def _detect(self, stop_event):
+        """检测主体，返回本线程打开的采集订阅（由_detect_loop关闭）"""
+        manager = get_vosk_model_manager()
+        subscription = None
+        while not stop_event.is_set():
             try:
-                if not os.path.exists(config.VOSK_MODEL_PATH):
-                    print(f"[唤醒词错误] 模型路径不存在: {config.VOSK_MODEL_PATH}")
-                    time.sleep(5)  # 等待5秒后重试
+                # 与本地语音识别共享同一个模型实例，模型在后台加载，这里分段等待，期间可随时停止
+                model_generation = manager.generation
+                model = manager.get(timeout=MODEL_WAIT_SECONDS)
+                if manager.generation != model_generation or manager.loading:
+                    # 仍在加载，或获取期间模型状态有变化（如刚完成加载），重新获取以取得一致的状态编号
+                    continue
+                if model is None:
+                    # 模型不可用（路径不存在或加载失败）时等待设置中修改模型路径，不轮询文件系统
+                    while not stop_event.is_set() and not manager.wait_for_change(model_generation, timeout=1.0):
+                        pass
                     continue
                 
-                if not self.model:
-                    self.model = Model(config.VOSK_MODEL_PATH)
-                
-                if not self.audio_interface:
-                    self.audio_interface = pyaudio.PyAudio()
+                # 从共享的采集总线读取音频，不单独打开麦克风
+                if not subscription:
+                    subscription = get_audio_capture().subscribe()
                 
-                # 尝试打开音频流
-                success = self._open_audio_stream()
-                if not success:
-                    print("[唤醒词] 5秒后重试...")
-                    time.sleep(5)
-                    continue
+                recognizer = self._create_recognizer(model)
+                # 释放对模型的引用（识别器内部仍持有），卸载模型后内存才能回收
+                model = None
                 
-                recognizer = KaldiRecognizer(self.model, 16000)
+                # 能量门控：安静时不送入识别器，检测到声音后连同之前的预录音频一起送入
+                vad = EnergyVAD(16000, get_audio_capture().noise_floor())
+                preroll = deque(maxlen=max(1, int(GATE_PREROLL_SECONDS * 16000 / BLOCK_SIZE)))
+                gate_open = False
+                quiet_seconds = 0.0
+                was_paused = False
+                echo_volumes = deque(maxlen=max(1, int(ECHO_WINDOW_SECONDS * 16000 / BLOCK_SIZE)))
                 
                 print("[唤醒词] 开始监听唤醒词...")
                 
-                while self.running:
+                while not stop_event.is_set():
+                    if manager.generation != model_generation:
+                        # 模型已重新加载或卸载，重新创建识别器
+                        print("[唤醒词] 模型已变更")
+                        break
+                    
+                    data = subscription.read(timeout=0.5)
+                    if data is None:
+                        continue
+                    
                     with self.stream_lock:
                         is_paused = self.paused
+                    playing = bool(self.playback_active and self.playback_active())
+                    if playing and not config.WAKE_BARGE_IN:
+                        # 不允许打断时，播报期间不检测，避免把播报声音当成唤醒词
+                        is_paused = True
                     
                     if is_paused:
-                        # 暂停期间等待
-                        time.sleep(0.1)
+                        # 暂停期间丢弃音频
+                        was_paused = True
                         continue
+                    if was_paused:
+                        # 恢复后从干净的状态开始，不带入暂停前的音频
+                        was_paused = False
+                        gate_open = False
+                        preroll.clear()
+                        recognizer.Reset()
                     
-                    try:
-                        # 检查流是否仍然活跃
-                        if not self.audio_stream or not self.audio_stream.is_active():
-                            print("[唤醒词] 音频流断开，尝试重新连接...")
-                            break
-                        
-                        data = self.audio_stream.read(4000, exception_on_overflow=False)
-                        if recognizer.AcceptWaveform(data):
-                            result = json.loads(recognizer.Result())
-                            text = result.get("text", "")
-                            if text:
-                                print(f"[唤醒词识别] {text}")
-                            # 移除空格进行匹配，支持识别结果中有空格的情况
-                            text_no_space = text.replace(" ", "")
-                            wake_word_no_space = config.WAKE_WORD.replace(" ", "")
-                            if wake_word_no_space in text_no_space:
-                                print(f"[唤醒词] 检测到唤醒词: {config.WAKE_WORD}")
-                                if self.callback:
-                                    self.callback()
-                    except Exception as e:
-                        # 如果是流关闭错误，重新尝试连接
-                        if "Stream closed" in str(e) or "-9988" in str(e) or "Input overflowed" in str(e):
-                            print(f"[唤醒词] 音频流异常: {e}")
-                            break
-                        # 其他错误继续运行
-                        print(f"[唤醒词] 读取音频出错: {e}")
-                        time.sleep(0.1)
-                
-                # 清理当前音频流
-                if self.audio_stream:
-                    try:
-                        self.audio_stream.stop_stream()
-                        self.audio_stream.close()
-                    except:
-                        pass
-                    self.audio_stream = None
-                
-            except Exception as e:
-                print(f"[唤醒词错误] {e}")
-                time.sleep(5)  # 出错后等待5秒重试
-    
-    def _open_audio_stream(self):
-        """打开音频流"""
-        try:
-            # 列出所有可用的音频设备
-            print("[唤醒词] 扫描音频设备...")
-            input_devices = []
-            for i in range(self.audio_interface.get_device_count()):
-                device_info = self.audio_interface.get_device_info_by_index(i)
-                if device_info['maxInputChannels'] > 0:
-                    input_devices.append((i, device_info))
-                    print(f"[唤醒词] 找到输入设备 {i}: {device_info['name']}")
-            
-            if not input_devices:
-                print("[唤醒词错误] 未找到任何音频输入设备")
-                print("[唤醒词] 请检查:")
-                print("  1. 麦克风是否已连接")
-                print("  2. 麦克风驱动是否已安装")
-                print("  3. 麦克风权限是否已授予")
-                return False
-            
-            # 获取可用的音频设备
-            device_index = config.MICROPHONE_DEVICE_INDEX
-            if device_index is not None:
-                # 验证指定的设备是否存在且为输入设备
-                try:
-                    device_info = self.audio_interface.get_device_info_by_index(device_index)
-                    if device_info['maxInputChannels'] == 0:
-                        print(f"[唤醒词错误] 设备 {device_index} 不是输入设备")
-                        device_index = None
+                    if playing:
+                        # 回声门限：麦克风音量需超过播报回声音量（最近几秒音量的中位数，
+                        # 一两秒的唤醒词对中位数影响很小）的WAKE_BARGE_IN_RATIO倍才视为有人说话
+                        echo_volumes.append(np.abs(np.frombuffer(data, dtype=np.int16)).mean())
+                        vad.min_level = float(np.median(echo_volumes)) * config.WAKE_BARGE_IN_RATIO
                     else:
-                        print(f"[唤醒词] 使用指定麦克风设备: {device_index} - {device_info['name']}")
-                except Exception as e:
-                    print(f"[唤醒词错误] 无法访问设备 {device_index}: {e}")
-                    device_index = None
-            
-            if device_index is None:
-                # 使用第一个可用的输入设备
-                device_index = input_devices[0][0]
-                device_info = input_devices[0][1]
-                print(f"[唤醒词] 使用第一个可用麦克风设备: {device_index} - {device_info['name']}")
-            
-            # 尝试打开音频流
-            try:
-                self.audio_stream = self.audio_interface.open(
-                    format=pyaudio.paInt16,
-                    channels=1,
-                    rate=16000,
-                    input=True,
-                    frames_per_buffer=4000,
-                    input_device_index=device_index
-                )
-                print(f"[唤醒词] 音频流已成功打开，使用设备: {device_index}")
-                return True
-            except Exception as e:
-                print(f"[唤醒词错误] 无法打开音频流: {e}")
-                print(f"[唤醒词错误] 错误详情: {type(e).__name__}: {str(e)}")
-                
-                # 尝试其他可用设备
-                for idx, device_info in input_devices:
-                    if idx == device_index:
-                        continue
-                    try:
-                        print(f"[唤醒词] 尝试设备 {idx}: {device_info['name']}")
-                        self.audio_stream = self.audio_interface.open(
-                            format=pyaudio.paInt16,
-                            channels=1,
-                            rate=16000,
-                            input=True,
-                            frames_per_buffer=4000,
-                            input_device_index=idx
-                        )
-                        print(f"[唤醒词] 成功使用设备 {idx}: {device_info['name']}")
-                        return True
-                    except Exception as e2:
-                        print(f"[唤醒词] 设备 {idx} 失败: {e2}")
+                        echo_volumes.clear()
+                        vad.min_level = 0.0
+                        if not config.WAKE_GATE_ENABLED:
+                            self._feed(recognizer, data)
+                            continue
+                    
+                    is_speech = vad.process(data)
+                    if not gate_open:
+                        preroll.append(data)
+                        if not is_speech:
+                            continue
+                        gate_open = True
+                        quiet_seconds = 0.0
+                        for block in preroll:
+                            self._feed(recognizer, block)
+                        preroll.clear()
                         continue
-                else:
-                    print("[唤醒词错误] 所有音频设备都无法打开")
-                    return False
                     
-        except Exception as e:
-            print(f"[唤醒词错误] 打开音频流时出错: {e}")
-            return False
\ No newline at end of file
+                    self._feed(recognizer, data)
+                    quiet_seconds = 0.0 if is_speech else quiet_seconds + BLOCK_SIZE / 16000
+                    if quiet_seconds >= GATE_HANGOVER_SECONDS:
+                        # 安静一段时间后关闭门控，取出识别器中剩余的结果（同时重置识别器）
+                        gate_open = False
+                        self._check(json.loads(recognizer.FinalResult()).get("text", ""), recognizer)
+                
+            except Exception as e:
+                print(f"[唤醒词错误] {e}")
+                stop_event.wait(5)  # 出错后等待5秒重试
+        return subscription
@@ -1,4 +1,5 @@
 import requests
+from services.http_client import get_http_client
 import config
 
 class WeatherService:
@@ -38,7 +39,7 @@ class WeatherService:
             # 获取实时天气
             weather_url = f"{config.WEATHER_API_URL}/weather/now"
             params = {"location": location, "key": config.WEATHER_API_KEY}
-            response = requests.get(weather_url, params=params, timeout=10)
+            response = get_http_client().get(weather_url, params=params, timeout=10)
             
             print(f"[Weather Debug] 天气查询状态: {response.status_code}")
             print(f"[Weather Debug] 请求URL: {weather_url}")
@@ -98,7 +99,7 @@ class WeatherService:
             
             forecast_url = f"{config.WEATHER_API_URL}/weather/7d"
             params = {"location": location, "key": config.WEATHER_API_KEY}
-            response = requests.get(forecast_url, params=params, timeout=10)
+            response = get_http_client().get(forecast_url, params=params, timeout=10)
             
             if response.status_code != 200:
                 return f"预报数据请求失败: HTTP {response.status_code}"
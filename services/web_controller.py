@@ -1,5 +1,5 @@
 import webbrowser
-import requests
+from services.http_client import get_http_client
 from bs4 import BeautifulSoup
 
 class WebController:
@@ -20,7 +20,7 @@ class WebController:
     
     def read_webpage(self, url):
         try:
-            response = requests.get(url, timeout=10)
+            response = get_http_client().get(url, timeout=10)
             response.encoding = response.apparent_encoding
             soup = BeautifulSoup(response.text, 'html.parser')
             
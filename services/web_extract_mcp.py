@@ -1,4 +1,4 @@
-import requests
+from services.http_client import get_http_client
 from bs4 import BeautifulSoup
 import re
 
@@ -6,7 +6,7 @@ class WebExtractMCP:
     def extract_main_content(self, url):
         """智能提取网页主要内容"""
         try:
-            response = requests.get(url, timeout=10, headers={'User-Agent': 'Mozilla/5.0'})
+            response = get_http_client().get(url, timeout=10, headers={'User-Agent': 'Mozilla/5.0'})
             response.encoding = response.apparent_encoding
             
             soup = BeautifulSoup(response.text, 'html.parser')